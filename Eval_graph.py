@@ -1,15 +1,511 @@
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from pathlib import Path
 import concurrent.futures
 import os
-from typing import List, Dict, Tuple, Optional
+import json
+from typing import Callable, List, Dict, Sequence, Tuple, Optional, Union
 import datetime
 
+def _descending_order(values: np.ndarray) -> np.ndarray:
+    """
+    Row order of every column as given by Series.sort_values(ascending=False).
+    
+    Reproduces pandas' nargsort: the non-NaN values are reversed, argsorted with
+    numpy's quicksort, and the result is reversed back, with NaN rows appended
+    last. The order of tied scores therefore matches pandas, not row order.
+    
+    Args:
+        values: Scores of shape (n_rows, n_cols)
+        
+    Returns:
+        Row positions of shape (n_rows, n_cols), best first
+    """
+    n_rows = values.shape[0]
+    order = np.empty(values.shape, dtype=np.int64)
+    has_nan = np.isnan(values).any(axis=0) if values.dtype.kind == 'f' else np.zeros(values.shape[1], dtype=bool)
+    
+    # Columns without NaN sort together: argsort along axis 0 sorts each column on its own
+    full = np.flatnonzero(~has_nan)
+    if len(full):
+        order[:, full] = (n_rows - 1 - np.argsort(values[::-1][:, full], axis=0, kind='quicksort'))[::-1]
+    for col in np.flatnonzero(has_nan):
+        mask = np.isnan(values[:, col])
+        non_nan_idx = np.flatnonzero(~mask)[::-1]
+        ranked = non_nan_idx[values[non_nan_idx, col].argsort(kind='quicksort')][::-1]
+        order[:, col] = np.concatenate([ranked, np.flatnonzero(mask)])
+    return order
+
+
+def _top_k_rows(values: np.ndarray, exclude: np.ndarray, k: int) -> np.ndarray:
+    """
+    Select the k largest entries of every column of a score block.
+    
+    Equivalent to sorting each column with Series.sort_values(ascending=False)
+    (NaN last), dropping the row given in `exclude` and taking the head. Columns
+    whose selection has no tied scores only need a partial selection. Columns
+    with ties inside the selection or at its boundary are fully sorted with
+    _descending_order, so tied rows come out in the same order as in pandas.
+    
+    Args:
+        values: Scores of shape (n_rows, n_cols)
+        exclude: Row to skip for each column (the stock itself)
+        k: Number of rows to keep, at most n_rows - 1
+        
+    Returns:
+        Row positions of shape (n_cols, k), best first
+    """
+    n_cols = values.shape[1]
+    col_pos = np.arange(n_cols)
+    
+    # Ascending key: negated score with NaN scores ranked last, and the excluded
+    # row marked NaN so it sorts after everything and never compares equal
+    key = np.negative(values, dtype=np.float64)
+    np.nan_to_num(key, copy=False, nan=np.inf, posinf=np.inf, neginf=-np.inf)
+    key[exclude, col_pos] = np.nan
+    
+    # k-th smallest key per column; the rows strictly below it plus enough rows at it
+    threshold = np.partition(key, k - 1, axis=0)[k - 1]
+    below = key < threshold
+    at = key == threshold
+    need = k - below.sum(axis=0)
+    chosen = below | (at & (np.cumsum(at, axis=0) <= need))
+    
+    # Exactly k rows per column, ordered by key
+    rows = np.nonzero(chosen.T)[1].reshape(n_cols, k)
+    top_keys = key[rows, col_pos[:, None]]
+    order = np.argsort(top_keys, axis=1, kind='stable')
+    top = np.take_along_axis(rows, order, axis=1)
+    top_keys = np.take_along_axis(top_keys, order, axis=1)
+    
+    # Tied scores: which rows are kept and in what order follows pandas' sort
+    tied = np.flatnonzero((at.sum(axis=0) > need) | (top_keys[:, 1:] == top_keys[:, :-1]).any(axis=1))
+    if len(tied):
+        full = _descending_order(values[:, tied]).T
+        kept = full != exclude[tied, None]
+        top[tied] = full[kept].reshape(len(tied), -1)[:, :k]
+    return top
+
+
+def _read_feather_layout(path: Path) -> Tuple[pd.Index, List[str]]:
+    """
+    Read the row labels and data column names of a feather adjacency matrix.
+    
+    Only the schema and the index column are touched, the matrix itself is not read
+    (the dataset scanner reads just the bytes of the requested columns).
+    
+    Args:
+        path: Path to the feather file
+        
+    Returns:
+        Tuple of (row labels, data column names)
+    """
+    with pa.memory_map(str(path), 'r') as source:
+        schema = pa.ipc.open_file(source).schema
+    index_columns = (schema.pandas_metadata or {}).get('index_columns', [])
+    data_columns = [name for name in schema.names if name not in index_columns]
+    
+    if index_columns and isinstance(index_columns[0], str):
+        table = ds.dataset(path, format='feather').to_table(columns=[index_columns[0]])
+        return pd.Index(table.column(0).to_pandas(), name=index_columns[0]), data_columns
+    if index_columns:
+        # Serialized RangeIndex, stored as metadata only
+        rng = index_columns[0]
+        return pd.RangeIndex(rng['start'], rng['stop'], rng['step'], name=rng.get('name')), data_columns
+    return pd.RangeIndex(ds.dataset(path, format='feather').count_rows()), data_columns
+
+
+# Decoded size of the columns read together by _read_feather_block
+READ_GROUP_BYTES = 8 << 20
+
+
+def _read_feather_block(path: Path,
+                        index: pd.Index,
+                        columns: List[str],
+                        rows: Optional[np.ndarray] = None,
+                        dtype: Optional[str] = None) -> pd.DataFrame:
+    """
+    Read a row/column subset of a feather adjacency matrix.
+    
+    The block is filled a group of columns at a time (about READ_GROUP_BYTES of
+    decoded data), and each group is released before the next one is decoded.
+    The dataset scanner reads only the bytes of the requested columns, while
+    feather.read_table with a column subset holds the whole record batch body
+    (compressed or not) in memory, i.e. a second copy of the matrix next to the block.
+    
+    Args:
+        path: Path to the feather file
+        index: Row labels of the file, as returned by _read_feather_layout
+        columns: Data columns to read
+        rows: Row positions to keep (all rows if None)
+        dtype: Target dtype of the block (e.g. 'float32'), the stored dtype if None
+        
+    Returns:
+        Adjacency block with the selected rows and columns
+    """
+    columns = list(columns)
+    dataset = ds.dataset(path, format='feather')
+    if dtype is None:
+        dtype = np.result_type(*[dataset.schema.field(name).type.to_pandas_dtype() for name in columns])
+    n_rows = len(index) if rows is None else len(rows)
+    
+    # Column-major, so copying one column and slicing query columns later are contiguous
+    values = np.empty((n_rows, len(columns)), dtype=dtype, order='F')
+    group = max(1, READ_GROUP_BYTES // max(8 * len(index), 1))
+    for start in range(0, len(columns), group):
+        table = dataset.to_table(columns=columns[start:start + group])
+        for i, column in enumerate(table.columns, start):
+            column = column.to_numpy()
+            values[:, i] = column if rows is None else column[rows]
+        del table, column
+    
+    return pd.DataFrame(values, index=index if rows is None else index[rows], columns=columns, copy=False)
+
+
+def _dense_top_k(df: pd.DataFrame, stocks: List[str], k: int, block_size: int) -> np.ndarray:
+    """
+    Get the top k most similar stocks for every stock in a dense adjacency matrix.
+    
+    Args:
+        df: Adjacency matrix
+        stocks: Stock codes to query (each must be both a row and a column of df)
+        k: Number of similar stocks to retrieve
+        block_size: Number of query columns ranked together
+        
+    Returns:
+        Row positions of shape (len(stocks), min(k, len(df) - 1)), most similar first
+    """
+    cols = df.columns.get_indexer(stocks)
+    rows = df.index.get_indexer(stocks)
+    if (cols < 0).any() or (rows < 0).any():
+        missing = [s for s, c, r in zip(stocks, cols, rows) if c < 0 or r < 0]
+        raise KeyError(f"Stocks missing from adjacency matrix: {missing[:5]}")
+    
+    values = df.to_numpy()
+    k_eff = min(k, len(df) - 1)
+    top = np.empty((len(stocks), max(k_eff, 0)), dtype=np.int64)
+    if k_eff <= 0:
+        return top
+    
+    for start in range(0, len(stocks), block_size):
+        stop = min(start + block_size, len(stocks))
+        top[start:stop] = _top_k_rows(values[:, cols[start:stop]], rows[start:stop], k_eff)
+    return top
+
+
+# Stock-code dictionaries of top-K roots, keyed by (path, mtime) so appended codes are picked up
+_STOCK_CODES_CACHE: Dict[Tuple[str, int], np.ndarray] = {}
+
+
+def _load_stock_codes(root: Path) -> np.ndarray:
+    """Load the stock-code dictionary shared by all top-K files under root."""
+    path = root / TopKGraph.CODES_FILE
+    if not path.exists():
+        return np.array([], dtype=str)
+    key = (str(path), path.stat().st_mtime_ns)
+    if key not in _STOCK_CODES_CACHE:
+        _STOCK_CODES_CACHE[key] = np.load(path, allow_pickle=False)
+    return _STOCK_CODES_CACHE[key]
+
+
+class TopKGraph:
+    """
+    Top-K neighbour lists of one date's adjacency matrix in a CSR-like layout.
+    
+    The neighbours of node i are indices[indptr[i]:indptr[i + 1]], most similar
+    first, with similarities scores[indptr[i]:indptr[i + 1]]. Nodes and neighbours
+    are int32 ids into the stock-code dictionary shared by every date under the
+    same root (stored as <root>/stock_codes.npy, append-only).
+    
+    Files live next to the dense matrices as <root>/<year>/<date>.topk.npz.
+    """
+    SUFFIX = '.topk.npz'
+    CODES_FILE = 'stock_codes.npy'
+    
+    def __init__(self,
+                 codes: np.ndarray,
+                 nodes: np.ndarray,
+                 indptr: np.ndarray,
+                 indices: np.ndarray,
+                 scores: np.ndarray,
+                 k: int):
+        self.codes = codes
+        self.nodes = nodes
+        self.indptr = indptr
+        self.indices = indices
+        self.scores = scores
+        self.k = k
+    
+    @property
+    def index(self) -> pd.Index:
+        """Stock codes of the nodes."""
+        return pd.Index(self.codes[self.nodes])
+    
+    @property
+    def candidates(self) -> pd.Index:
+        """Stock codes that neighbour ids refer to (the whole dictionary)."""
+        return pd.Index(self.codes)
+    
+    def top_k(self, stocks: List[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the stored top k neighbours of every stock in a batch.
+        
+        Args:
+            stocks: Stock codes to query (each must be a node)
+            k: Number of similar stocks to retrieve, at most the stored K
+            
+        Returns:
+            Tuple of (dictionary ids, similarities), each of shape (len(stocks), k_eff),
+            most similar first
+        """
+        if k > self.k:
+            raise ValueError(f"Requested top {k} neighbours but only top {self.k} are stored")
+        pos = self.index.get_indexer(stocks)
+        if (pos < 0).any():
+            missing = [s for s, p in zip(stocks, pos) if p < 0]
+            raise KeyError(f"Stocks missing from top-K graph: {missing[:5]}")
+        
+        # Lists are only shorter than K when the matrix had at most K stocks
+        k_eff = min(k, np.diff(self.indptr)[pos].min(initial=k))
+        flat = self.indptr[pos][:, None] + np.arange(k_eff)
+        return self.indices[flat].astype(np.int64), self.scores[flat]
+    
+    @classmethod
+    def from_dense(cls, df: pd.DataFrame, codes: np.ndarray, k: int, block_size: int) -> 'TopKGraph':
+        """
+        Build top-K neighbour lists from a dense adjacency matrix.
+        
+        Args:
+            df: Adjacency matrix
+            codes: Stock-code dictionary, must contain every row label of df
+            k: Number of neighbours to keep per node
+            block_size: Number of query columns ranked together
+            
+        Returns:
+            TopKGraph holding the same neighbours _dense_top_k returns
+        """
+        dictionary = pd.Index(codes)
+        row_ids = dictionary.get_indexer(df.index)
+        if (row_ids < 0).any():
+            raise KeyError("Stock-code dictionary does not cover the adjacency matrix")
+        
+        columns = set(df.columns)
+        nodes = [stock for stock in df.index if stock in columns]
+        top = _dense_top_k(df, nodes, k, block_size)
+        scores = df.to_numpy()[top, df.columns.get_indexer(nodes)[:, None]]
+        
+        return cls(
+            codes=codes,
+            nodes=dictionary.get_indexer(nodes).astype(np.int32),
+            indptr=np.arange(len(nodes) + 1, dtype=np.int64) * top.shape[1],
+            indices=row_ids[top].astype(np.int32).ravel(),
+            scores=scores.astype(np.float32).ravel(),
+            k=k
+        )
+    
+    @classmethod
+    def load(cls, path: Path, codes: np.ndarray) -> 'TopKGraph':
+        """Load a top-K file written by save."""
+        with np.load(path, allow_pickle=False) as data:
+            return cls(codes, data['nodes'], data['indptr'], data['indices'], data['scores'], int(data['k']))
+    
+    def save(self, path: Path) -> None:
+        """Write the neighbour lists (without the dictionary) to path."""
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, nodes=self.nodes, indptr=self.indptr, indices=self.indices,
+                     scores=self.scores, k=np.int32(self.k))
+        os.replace(tmp_path, path)
+
+
+def _candidate_index(data: Union[pd.DataFrame, TopKGraph]) -> pd.Index:
+    """Stock codes that the positions returned by _get_top_k_similar refer to."""
+    return data.candidates if isinstance(data, TopKGraph) else data.index
+
+
+def _topk_is_current(topk_file: Path, dense_file: Path) -> bool:
+    """Whether a top-K file exists and is not older than its dense matrix (if that still exists)."""
+    if not topk_file.exists():
+        return False
+    return not dense_file.exists() or dense_file.stat().st_mtime_ns <= topk_file.stat().st_mtime_ns
+
+
+# Manifest caching the dates found in each <root>/<year> directory
+DATE_INDEX_FILE = '_date_index.json'
+
+
+def _scan_year_dir(year_dir: Path) -> List[str]:
+    """Dates with a dense (.feather) or top-K (.topk.npz) file in one year directory."""
+    dates = set()
+    with os.scandir(year_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(TopKGraph.SUFFIX):
+                dates.add(entry.name[:-len(TopKGraph.SUFFIX)])
+            elif entry.name.endswith('.feather'):
+                dates.add(entry.name[:-len('.feather')])
+    return sorted(dates)
+
+
+def _list_dates(root: Path,
+                start_year: int = None,
+                end_year: int = None,
+                use_index: bool = True) -> set:
+    """
+    Dates with a dense or top-K file under root/<year>, for years in range.
+    
+    Only year directories inside start_year..end_year are listed. With use_index,
+    the dates of each year directory are kept in <root>/_date_index.json together
+    with the directory's mtime, and a directory is only listed again once its
+    mtime changes (i.e. files were added or removed), so past years cost one stat.
+    
+    Args:
+        root: Directory containing <year>/<date> files
+        start_year: Starting year (inclusive)
+        end_year: Ending year (inclusive)
+        use_index: Read and refresh the manifest file
+        
+    Returns:
+        Set of dates
+    """
+    index_file = root / DATE_INDEX_FILE
+    index = {}
+    if use_index and index_file.exists():
+        try:
+            with open(index_file, 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+    
+    dates = set()
+    changed = False
+    with os.scandir(root) as entries:
+        year_dirs = [entry for entry in entries
+                     if entry.is_dir() and len(entry.name) == 4 and entry.name.isdigit()]
+    for entry in year_dirs:
+        year = int(entry.name)
+        if (start_year is not None and year < start_year) or (end_year is not None and year > end_year):
+            continue
+        mtime = entry.stat().st_mtime_ns
+        cached = index.get(entry.name)
+        if cached is None or cached['mtime_ns'] != mtime:
+            cached = {'mtime_ns': mtime, 'dates': _scan_year_dir(Path(entry.path))}
+            index[entry.name] = cached
+            changed = True
+        dates.update(cached['dates'])
+    
+    if use_index and changed:
+        # Best effort: data directories may be read-only
+        try:
+            tmp_file = index_file.with_name(index_file.name + f'.{os.getpid()}.tmp')
+            with open(tmp_file, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp_file, index_file)
+        except OSError:
+            pass
+    return dates
+
+
+def _shared_stock_ids(graph_index: pd.Index, label_index: pd.Index) -> Tuple[np.ndarray, np.ndarray]:
+    """Map the row labels of both matrices to integer ids in one shared code space."""
+    graph_ids = np.arange(len(graph_index))
+    label_ids = graph_index.get_indexer(label_index)
+    only_label = label_ids < 0
+    label_ids[only_label] = len(graph_index) + np.arange(only_label.sum())
+    return graph_ids, label_ids
+
+
+def _recall(match: np.ndarray, actual_scores: np.ndarray, k: int) -> np.ndarray:
+    """Share of the actual top k that is in the predicted top k."""
+    found = match[:, :k, :k].any(axis=1)
+    return found.sum(axis=1) / found.shape[1] if found.shape[1] else np.zeros(len(found))
+
+
+def _precision(match: np.ndarray, actual_scores: np.ndarray, k: int) -> np.ndarray:
+    """Share of the predicted top k that is in the actual top k."""
+    hits = match[:, :k, :k].any(axis=2)
+    return hits.sum(axis=1) / hits.shape[1] if hits.shape[1] else np.zeros(len(hits))
+
+
+def _ndcg(match: np.ndarray, actual_scores: np.ndarray, k: int) -> np.ndarray:
+    """NDCG of the predicted top k, counting actual top-k members as relevant."""
+    hits = match[:, :k, :k].any(axis=2)
+    discounts = 1 / np.log2(np.arange(hits.shape[1]) + 2)
+    ideal = discounts[:min(hits.shape[1], match[:, :k, :k].shape[2])].sum()
+    return hits @ discounts / ideal if ideal > 0 else np.zeros(len(hits))
+
+
+def _map(match: np.ndarray, actual_scores: np.ndarray, k: int) -> np.ndarray:
+    """Average precision of the predicted top k, counting actual top-k members as relevant."""
+    hits = match[:, :k, :k].any(axis=2)
+    n_relevant = min(hits.shape[1], match[:, :k, :k].shape[2])
+    if n_relevant == 0:
+        return np.zeros(len(hits))
+    precision_at = np.cumsum(hits, axis=1) / np.arange(1, hits.shape[1] + 1)
+    return (precision_at * hits).sum(axis=1) / n_relevant
+
+
+def _rank_corr(match: np.ndarray, actual_scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Spearman correlation between the ranks of the actual top k and their ranks in
+    the full predicted list, with stocks missing from it ranked last (NaN if undefined).
+    """
+    sub = match[:, :, :k]
+    actual_rank = np.broadcast_to(np.arange(sub.shape[2], dtype=np.float64), sub.shape[::2])
+    pred_rank = np.where(sub.any(axis=1), sub.argmax(axis=1), sub.shape[1]).astype(np.float64)
+    
+    actual_dev = actual_rank - actual_rank.mean(axis=1, keepdims=True)
+    pred_dev = pred_rank - pred_rank.mean(axis=1, keepdims=True)
+    denom = np.sqrt((actual_dev ** 2).sum(axis=1) * (pred_dev ** 2).sum(axis=1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(denom > 0, (actual_dev * pred_dev).sum(axis=1) / denom, np.nan)
+
+
+def _weighted_overlap(match: np.ndarray, actual_scores: np.ndarray, k: int) -> np.ndarray:
+    """Share of the actual top-k similarity mass found in the predicted top k (NaN if no mass)."""
+    found = match[:, :k, :k].any(axis=1)
+    weights = actual_scores[:, :found.shape[1]]
+    total = weights.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(total != 0, (weights * found).sum(axis=1) / total, np.nan)
+
+
+# Per-stock metrics computed from the shared top-k neighbour lists of a date.
+# Each takes (match, actual_scores, k) where match[s, i, j] is True when the i-th
+# predicted neighbour of stock s is its j-th actual neighbour, and actual_scores
+# holds the label similarities of the actual neighbours; new metrics can be added here.
+METRICS: Dict[str, Callable[[np.ndarray, np.ndarray, int], np.ndarray]] = {
+    'recall': _recall,
+    'precision': _precision,
+    'ndcg': _ndcg,
+    'map': _map,
+    'rank_corr': _rank_corr,
+    'weighted_overlap': _weighted_overlap,
+}
+
+
 class GraphEvaluator:
-    def __init__(self, graph_path: str, label_path: str, start_year: int = None, end_year: int = None):
+    # Default metrics and k values reported per date, and the default neighbour
+    # list length kept by convert_to_topk
+    DEFAULT_METRICS = ('recall',)
+    K_VALUES = (1, 5, 10, 20)
+    TOP_K = 20
+    # Number of query stocks whose columns are ranked together
+    BLOCK_SIZE = 1024
+    # Columns identifying a cached result: date, graph/label file mtime and size, then the
+    # settings that change results (metric labels and loader options, see _cache_settings)
+    CACHE_KEYS = ('date', 'graph_mtime', 'graph_size', 'label_mtime', 'label_size',
+                  'metrics', 'common_only', 'dtype')
+    
+    def __init__(self, graph_path: str, label_path: str, start_year: int = None, end_year: int = None,
+                 dtype: Optional[str] = None, common_only: bool = False, dates: Optional[List[str]] = None,
+                 cache_path: Optional[str] = None, metrics: Sequence[str] = DEFAULT_METRICS,
+                 k_values: Sequence[int] = K_VALUES, detail_path: Optional[str] = None,
+                 use_date_index: bool = True):
         """
         Initialize the GraphEvaluator.
         
@@ -18,18 +514,64 @@ class GraphEvaluator:
             label_path: Path to the directory containing label adjacency matrices
             start_year: Starting year for evaluation (inclusive)
             end_year: Ending year for evaluation (inclusive)
+            dtype: Dtype to load matrices as (e.g. 'float32' to halve memory), the stored dtype if None
+            common_only: Only load rows of stocks present in both matrices, so neighbours
+                are restricted to the common stock set as well (dense files only)
+            dates: Dates to evaluate, discovered from both directories if None
+            cache_path: Feather file of per-date results reused across runs; a date is
+                only recomputed when its files' mtime/size, the metrics, common_only
+                or dtype change
+            metrics: Names of metrics in the METRICS registry to compute
+            k_values: Cut-offs at which every metric is computed
+            detail_path: Directory to stream per-(date, stock, k) metric values to, as
+                Parquet partitioned by year (<detail_path>/year=<yyyy>/<date>.parquet)
+            use_date_index: Keep the dates found under each root in a _date_index.json
+                manifest, so only year directories that changed are listed again
+        
+        Each date may be stored as a dense <date>.feather matrix or as top-K
+        neighbour lists (<date>.topk.npz, see convert_to_topk); top-K files are
+        used when both exist, unless the dense matrix is newer than the top-K file.
         """
         self.graph_path = Path(graph_path)
         self.label_path = Path(label_path)
         self.start_year = start_year
         self.end_year = end_year
-        self.dates = self._get_common_dates()
+        self.dtype = dtype
+        self.common_only = common_only
+        self.use_date_index = use_date_index
+        self.dates = self._get_common_dates() if dates is None else list(dates)
+        self.cache_path = Path(cache_path) if cache_path is not None else None
+        
+        unknown = [m for m in metrics if m not in METRICS]
+        if unknown:
+            raise ValueError(f"Unknown metrics: {unknown}")
+        self.metrics = list(metrics)
+        self.k_values = sorted(set(k_values))
+        # One top-k computation per date serves every metric and k value
+        self.top_k = max(self.k_values)
+        self.metric_labels = [f'{metric}@{k}' for metric in self.metrics for k in self.k_values]
+        self.detail_path = Path(detail_path) if detail_path is not None else None
+    
+    def _worker_config(self) -> Dict:
+        """Constructor arguments that rebuild this evaluator in a worker, without its date list."""
+        return {
+            'graph_path': str(self.graph_path),
+            'label_path': str(self.label_path),
+            'start_year': self.start_year,
+            'end_year': self.end_year,
+            'dtype': self.dtype,
+            'common_only': self.common_only,
+            'dates': [],
+            'metrics': self.metrics,
+            'k_values': self.k_values,
+            'detail_path': str(self.detail_path) if self.detail_path is not None else None
+        }
         
     def _get_common_dates(self) -> List[str]:
         """Get the list of dates that have both graph and label data within the specified year range."""
-        # Get all available dates
-        graph_files = set(f.stem for f in self.graph_path.glob("**/*.feather"))
-        label_files = set(f.stem for f in self.label_path.glob("**/*.feather"))
+        # Get all available dates, listing only the year directories in range
+        graph_files = _list_dates(self.graph_path, self.start_year, self.end_year, self.use_date_index)
+        label_files = _list_dates(self.label_path, self.start_year, self.end_year, self.use_date_index)
         common_dates = sorted(list(graph_files.intersection(label_files)))
         
         # Filter by year range if specified
@@ -48,173 +590,355 @@ class GraphEvaluator:
         
         return common_dates
     
-    def _load_data_for_date(self, date: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    def _load_data_for_date(self, date: str) -> Tuple[Union[pd.DataFrame, TopKGraph],
+                                                      Union[pd.DataFrame, TopKGraph]]:
         """
-        Load graph and label adjacency matrices for a specific date.
+        Load graph and label adjacency data for a specific date.
+        
+        Top-K files are loaded whole. Dense files are memory-mapped and only the
+        columns of the common stocks are read (and only their rows as well if
+        common_only is set).
         
         Args:
             date: Date in format 'yyyymmdd'
             
         Returns:
-            Tuple of (graph_df, label_df)
+            Tuple of (graph, label), each a DataFrame or a TopKGraph
         """
-        year = date[:4]
-        graph_file = self.graph_path / year / f"{date}.feather"
-        label_file = self.label_path / year / f"{date}.feather"
-        
         try:
-            graph_df = pd.read_feather(graph_file)
-            label_df = pd.read_feather(label_file)
-            return graph_df, label_df
+            graph, graph_index = self._open_date(self.graph_path, date)
+            label, label_index = self._open_date(self.label_path, date)
+            common_stocks = self._find_common_stocks(graph_index, label_index)
+            
+            if not isinstance(graph, TopKGraph):
+                graph_rows = graph_index.get_indexer(common_stocks) if self.common_only else None
+                graph = _read_feather_block(graph, graph_index, common_stocks, graph_rows, self.dtype)
+            if not isinstance(label, TopKGraph):
+                label_rows = label_index.get_indexer(common_stocks) if self.common_only else None
+                label = _read_feather_block(label, label_index, common_stocks, label_rows, self.dtype)
+            return graph, label
         except Exception as e:
             raise RuntimeError(f"Failed to load data for date {date}: {e}")
     
-    def _find_common_stocks(self, graph_df: pd.DataFrame, label_df: pd.DataFrame) -> List[str]:
+    def _open_date(self, root: Path, date: str) -> Tuple[Union[Path, TopKGraph], pd.Index]:
+        """
+        Open one date under root, preferring an up-to-date top-K file over the dense one.
+        
+        Returns:
+            Tuple of (TopKGraph or dense file path, stock codes of its nodes/rows)
+        """
+        path = self._date_file(root, date)
+        if path.name.endswith(TopKGraph.SUFFIX):
+            graph = TopKGraph.load(path, _load_stock_codes(root))
+            return graph, graph.index
+        return path, _read_feather_layout(path)[0]
+    
+    def _date_file(self, root: Path, date: str) -> Path:
+        """
+        File holding one date under root: the top-K file if present, else the dense one.
+        A top-K file older than the dense matrix was built from a previous version of
+        it, so the dense file is used until convert_to_topk rebuilds it.
+        """
+        topk_file = root / date[:4] / f"{date}{TopKGraph.SUFFIX}"
+        dense_file = root / date[:4] / f"{date}.feather"
+        return topk_file if _topk_is_current(topk_file, dense_file) else dense_file
+    
+    def _fingerprint(self, date: str) -> Tuple[int, int, int, int]:
+        """(mtime_ns, size) of the graph file followed by those of the label file."""
+        graph_stat = self._date_file(self.graph_path, date).stat()
+        label_stat = self._date_file(self.label_path, date).stat()
+        return graph_stat.st_mtime_ns, graph_stat.st_size, label_stat.st_mtime_ns, label_stat.st_size
+    
+    def _cache_settings(self) -> Dict[str, Union[str, bool]]:
+        """Settings stored with every cached result; results of other settings are not reused."""
+        return {
+            'metrics': ','.join(self.metric_labels),
+            'common_only': bool(self.common_only),
+            # The stored dtype is used if dtype is None; float32 can change ties
+            'dtype': np.dtype(self.dtype).name if self.dtype is not None else '',
+        }
+    
+    def _load_cached_results(self, fingerprints: Dict[str, Tuple[int, int, int, int]]) -> Dict[str, Dict[str, float]]:
+        """
+        Load cached results that are still valid.
+        
+        Args:
+            fingerprints: Current file fingerprint of every date to evaluate
+            
+        Returns:
+            Dictionary mapping dates to metric values, for dates whose cached
+            fingerprint and settings match the current ones
+        """
+        if self.cache_path is None or not self.cache_path.exists() or not fingerprints:
+            return {}
+        cache = pd.read_feather(self.cache_path)
+        # Rows of other metric sets may lack the current metric columns, and caches
+        # written before a settings column was added have no usable rows
+        if not set(self.CACHE_KEYS).issubset(cache.columns) or not set(self.metric_labels).issubset(cache.columns):
+            return {}
+        current = pd.DataFrame(list(fingerprints.values()), columns=self.CACHE_KEYS[1:5])
+        current['date'] = list(fingerprints.keys())
+        for key, value in self._cache_settings().items():
+            current[key] = value
+        
+        valid = cache.merge(current, on=list(self.CACHE_KEYS), how='inner')
+        if valid.empty:
+            return {}
+        return {
+            date: dict(zip(self.metric_labels, row))
+            for date, row in zip(valid['date'], valid[self.metric_labels].to_numpy().tolist())
+        }
+    
+    def _save_cached_results(self,
+                             results: Dict[str, Dict[str, float]],
+                             fingerprints: Dict[str, Tuple[int, int, int, int]]) -> None:
+        """
+        Add newly computed dates to the cache file, replacing older rows of the same
+        date and settings. Rows of other settings are kept, so alternating between
+        metric sets or loader options does not evict each other's results.
+        """
+        if self.cache_path is None:
+            return
+        rows = [(date,) + fingerprints[date] for date, values in results.items() if values]
+        if not rows:
+            return
+        new = pd.DataFrame(rows, columns=self.CACHE_KEYS[:5])
+        settings = self._cache_settings()
+        for key, value in settings.items():
+            new[key] = value
+        for label in self.metric_labels:
+            new[label] = [results[date][label] for date in new['date']]
+        
+        if self.cache_path.exists():
+            old = pd.read_feather(self.cache_path)
+            if set(self.CACHE_KEYS).issubset(old.columns):
+                replaced = old['date'].isin(new['date'])
+                for key, value in settings.items():
+                    replaced &= old[key] == value
+                new = pd.concat([old[~replaced], new], ignore_index=True)
+        new = new.sort_values(['date', 'metrics'], ignore_index=True)
+        
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_name(self.cache_path.name + '.tmp')
+        new.to_feather(tmp_path)
+        os.replace(tmp_path, self.cache_path)
+    
+    def _find_common_stocks(self, graph_index: pd.Index, label_index: pd.Index) -> List[str]:
         """Find stocks that are present in both adjacency matrices."""
-        graph_stocks = set(graph_df.index)
-        label_stocks = set(label_df.index)
+        graph_stocks = set(graph_index)
+        label_stocks = set(label_index)
         return sorted(list(graph_stocks.intersection(label_stocks)))
     
-    def _get_top_k_similar(self, df: pd.DataFrame, stock: str, k: int) -> List[str]:
+    def _get_top_k_similar(self,
+                           df: Union[pd.DataFrame, 'TopKGraph'],
+                           stocks: List[str],
+                           k: int) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Get the top k most similar stocks for a given stock.
+        Get the top k most similar stocks for every stock in a batch.
         
         Args:
-            df: Adjacency matrix
-            stock: Stock code
+            df: Dense adjacency matrix or stored top-K neighbour lists
+            stocks: Stock codes to query
             k: Number of similar stocks to retrieve
             
         Returns:
-            List of top k similar stock codes
+            Tuple of (positions in _candidate_index(df), similarities), one row per
+            stock, most similar first
         """
-        # Get the column for the stock and sort it in descending order
-        similarities = df[stock].sort_values(ascending=False)
-        
-        # Exclude the stock itself (which will have highest similarity)
-        if stock in similarities.index:
-            similarities = similarities.drop(stock)
-            
-        # Return the top k
-        return similarities.head(k).index.tolist()
+        if isinstance(df, TopKGraph):
+            return df.top_k(stocks, k)
+        rows = _dense_top_k(df, stocks, k, self.BLOCK_SIZE)
+        scores = df.to_numpy()[rows, df.columns.get_indexer(stocks)[:, None]]
+        return rows, scores
     
-    def _calculate_recall_at_k(self, 
-                              predicted: List[str], 
-                              actual: List[str], 
-                              k: int) -> float:
+    def _calculate_metrics(self,
+                           predicted: np.ndarray,
+                           actual: np.ndarray,
+                           actual_scores: np.ndarray) -> Dict[str, np.ndarray]:
         """
-        Calculate recall@k.
+        Calculate every configured metric at every k for a batch of stocks.
         
         Args:
-            predicted: List of predicted similar stocks
-            actual: List of actual similar stocks
-            k: k value for recall@k
+            predicted: Predicted similar stock ids, one row per stock, best first
+            actual: Actual similar stock ids, one row per stock, best first
+            actual_scores: Label similarities of the actual similar stocks
             
         Returns:
-            Recall@k value
+            Dictionary mapping metric labels (e.g. 'recall@5') to per-stock values
         """
-        # Take only the first k elements from each list
-        predicted_k = predicted[:k]
-        actual_k = actual[:k]
+        # Shared by all metrics: which predicted neighbour is which actual neighbour
+        # (ids are unique per row, so each predicted neighbour matches at most once)
+        match = predicted[:, :, None] == actual[:, None, :]
         
-        # Count how many predicted stocks are in the actual list
-        matches = len(set(predicted_k).intersection(set(actual_k)))
+        return {
+            f'{metric}@{k}': METRICS[metric](match, actual_scores, k)
+            for metric in self.metrics
+            for k in self.k_values
+        }
+    
+    def _detail_file(self, date: str) -> Path:
+        """Parquet file holding the per-stock metric values of one date."""
+        return self.detail_path / f"year={date[:4]}" / f"{date}.parquet"
+    
+    def _write_details(self, date: str, stocks: List[str], per_stock: Dict[str, np.ndarray]) -> None:
+        """
+        Write one date's per-stock metric values as a single Parquet file.
+        
+        Rows are (date, stock_code, k) with one column per metric; each date is its
+        own file, so memory stays at one date and a recomputed date replaces its rows.
+        """
+        n_stocks, n_k = len(stocks), len(self.k_values)
+        columns = {
+            'date': pa.array(np.full(n_stocks * n_k, int(date), dtype=np.int32)),
+            'stock_code': pa.array(np.repeat(np.asarray(stocks), n_k)).dictionary_encode(),
+            'k': pa.array(np.tile(np.asarray(self.k_values, dtype=np.int16), n_stocks)),
+        }
+        for metric in self.metrics:
+            # (stock, k) order, matching the key columns above
+            values = np.column_stack([per_stock[f'{metric}@{k}'] for k in self.k_values])
+            columns[metric] = pa.array(values.astype(np.float32).ravel())
         
-        # Calculate recall
-        return matches / len(actual_k) if actual_k else 0.0
+        path = self._detail_file(date)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        pq.write_table(pa.table(columns), tmp_path)
+        os.replace(tmp_path, path)
     
-    def process_date(self, date: str) -> Tuple[str, Dict[int, float]]:
+    def process_date(self, date: str) -> Tuple[str, Dict[str, float]]:
         """
-        Process a single date to calculate recall@k for different k values.
+        Process a single date to calculate the configured metrics for different k values.
         
         Args:
             date: Date in format 'yyyymmdd'
             
         Returns:
-            Tuple of (date, Dictionary mapping k values to mean recall@k)
+            Tuple of (date, Dictionary mapping metric labels such as 'recall@5' to their mean)
         """
         try:
-            graph_df, label_df = self._load_data_for_date(date)
-            common_stocks = self._find_common_stocks(graph_df, label_df)
+            graph, label = self._load_data_for_date(date)
+            common_stocks = self._find_common_stocks(graph.index, label.index)
             
-            # Dictionary to store recall values for different k
-            recalls = {1: [], 5: [], 10: [], 20: []}
+            # Top max(k) similar stocks from both matrices, for all stocks at once
+            # (we'll use these for every metric and k)
+            pred_rows, _ = self._get_top_k_similar(graph, common_stocks, self.top_k)
+            actual_rows, actual_scores = self._get_top_k_similar(label, common_stocks, self.top_k)
             
-            # Calculate recall for each stock
-            for stock in common_stocks:
-                # Get top 20 similar stocks from both matrices
-                # (we'll use these for different recall@k calculations)
-                pred_similar = self._get_top_k_similar(graph_df, stock, 20)
-                actual_similar = self._get_top_k_similar(label_df, stock, 20)
-                
-                # Calculate recall@k for different k values
-                for k in recalls.keys():
-                    recall = self._calculate_recall_at_k(pred_similar, actual_similar, k)
-                    recalls[k].append(recall)
+            # Compare neighbours as integer ids in one code space shared by both matrices
+            graph_ids, label_ids = _shared_stock_ids(_candidate_index(graph), _candidate_index(label))
+            pred_similar = graph_ids[pred_rows]
+            actual_similar = label_ids[actual_rows]
             
-            # Calculate mean recall for each k
-            mean_recalls = {k: np.mean(vals) for k, vals in recalls.items()}
+            per_stock = self._calculate_metrics(pred_similar, actual_similar, actual_scores)
+            if self.detail_path is not None:
+                self._write_details(date, common_stocks, per_stock)
+            mean_metrics = {
+                label: np.nanmean(values) if not np.isnan(values).all() else np.nan
+                for label, values in per_stock.items()
+            }
             
             print(f"Processed date: {date}")
-            return date, mean_recalls
+            return date, mean_metrics
             
         except Exception as e:
             print(f"Error processing date {date}: {e}")
             return date, {}
     
-    def evaluate_all_dates(self, max_workers: Optional[int] = None) -> Dict[str, Dict[int, float]]:
+    def evaluate_all_dates(self,
+                           max_workers: Optional[int] = None,
+                           chunksize: Optional[int] = None,
+                           use_threads: bool = False) -> Dict[str, Dict[str, float]]:
         """
-        Process all dates in parallel and return recall metrics.
+        Process all dates in parallel and return evaluation metrics.
+        
+        Dates are sent out in contiguous chunks. Worker processes rebuild the
+        evaluator once from its config in their initializer, so only date strings
+        go out and one array of metric values per chunk comes back. With use_threads the
+        chunks run on threads sharing this evaluator, which pays off because file
+        reads and NumPy partitioning release the GIL.
+        
+        With a cache_path, dates whose cached results are still valid are not
+        recomputed, and newly computed dates are added to the cache. With a
+        detail_path, every worker streams per-stock values to Parquet as it goes.
         
         Args:
             max_workers: Maximum number of worker threads/processes
+            chunksize: Number of dates per task, about four tasks per worker if None
+            use_threads: Use a thread pool instead of a process pool
             
         Returns:
-            Dictionary mapping dates to recall metrics
+            Dictionary mapping dates to metric values keyed by metric label
         """
         results = {}
+        dates = self.dates
+        fingerprints = {}
+        if self.cache_path is not None:
+            fingerprints = {date: self._fingerprint(date) for date in dates}
+            results = self._load_cached_results(fingerprints)
+            if self.detail_path is not None:
+                # Cached means are only enough if the per-stock file was written as well
+                results = {date: values for date, values in results.items() if self._detail_file(date).exists()}
+            dates = [date for date in dates if date not in results]
+            print(f"Reusing cached results for {len(results)} dates, {len(dates)} dates to compute")
+        if not dates:
+            return results
         
-        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
-            future_to_date = {executor.submit(self.process_date, date): date for date in self.dates}
-            
-            for future in concurrent.futures.as_completed(future_to_date):
-                date = future_to_date[future]
+        n_workers = max_workers or os.cpu_count() or 1
+        if chunksize is None:
+            chunksize = max(1, -(-len(dates) // (4 * n_workers)))
+        chunks = [dates[i:i + chunksize] for i in range(0, len(dates), chunksize)]
+        computed = {}
+        
+        if use_threads:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=n_workers)
+            future_to_chunk = {executor.submit(_evaluate_chunk, self, chunk): chunk for chunk in chunks}
+        else:
+            executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=n_workers, initializer=_init_worker, initargs=(self._worker_config(),)
+            )
+            future_to_chunk = {executor.submit(_evaluate_chunk_in_worker, chunk): chunk for chunk in chunks}
+        
+        with executor:
+            for future in concurrent.futures.as_completed(future_to_chunk):
+                chunk = future_to_chunk[future]
                 try:
-                    date, recalls = future.result()
-                    results[date] = recalls
+                    values, ok = future.result()
                 except Exception as e:
-                    print(f"Error processing date {date}: {e}")
+                    print(f"Error processing dates {chunk[0]}-{chunk[-1]}: {e}")
+                    continue
+                for date, row, valid in zip(chunk, values, ok):
+                    computed[date] = dict(zip(self.metric_labels, row.tolist())) if valid else {}
         
+        self._save_cached_results(computed, fingerprints)
+        results.update(computed)
         return results
     
-    def plot_results(self, results: Dict[str, Dict[int, float]], save_path: str) -> None:
+    def plot_results(self, results: Dict[str, Dict[str, float]], save_path: str) -> None:
         """
-        Plot recall metrics over time and save the plot.
+        Plot evaluation metrics over time and save the plot.
         
         Args:
-            results: Dictionary mapping dates to recall metrics
+            results: Dictionary mapping dates to metric values keyed by metric label
             save_path: Path to save the plot
         """
         # Convert dates from string to datetime for better x-axis formatting
         dates = [datetime.datetime.strptime(date, '%Y%m%d') for date in sorted(results.keys())]
         
-        # Extract recall values for each k
-        recall_1 = [results[date.strftime('%Y%m%d')].get(1, np.nan) for date in dates]
-        recall_5 = [results[date.strftime('%Y%m%d')].get(5, np.nan) for date in dates]
-        recall_10 = [results[date.strftime('%Y%m%d')].get(10, np.nan) for date in dates]
-        recall_20 = [results[date.strftime('%Y%m%d')].get(20, np.nan) for date in dates]
-        
-        # Create the plot
+        # Create the plot, one line per metric label
         plt.figure(figsize=(12, 8))
-        plt.plot(dates, recall_1, label='Recall@1', marker='o', linestyle='-')
-        plt.plot(dates, recall_5, label='Recall@5', marker='s', linestyle='-')
-        plt.plot(dates, recall_10, label='Recall@10', marker='^', linestyle='-')
-        plt.plot(dates, recall_20, label='Recall@20', marker='d', linestyle='-')
+        markers = ['o', 's', '^', 'd']
+        names = {'recall': 'Recall', 'precision': 'Precision', 'ndcg': 'NDCG', 'map': 'MAP'}
+        for i, label in enumerate(self.metric_labels):
+            values = [results[date.strftime('%Y%m%d')].get(label, np.nan) for date in dates]
+            metric, k = label.split('@')
+            plt.plot(dates, values, label=f'{names.get(metric, metric)}@{k}',
+                     marker=markers[i % len(markers)], linestyle='-')
         
         # Set plot properties
         year_range = f"{self.start_year}-{self.end_year}" if self.start_year and self.end_year else "All Years"
-        plt.title(f'Recall Performance Over Time ({year_range})')
+        title = 'Recall' if self.metrics == ['recall'] else 'Graph Evaluation'
+        plt.title(f'{title} Performance Over Time ({year_range})')
         plt.xlabel('Date')
-        plt.ylabel('Recall')
+        plt.ylabel(title if self.metrics == ['recall'] else 'Metric Value')
         plt.grid(True, alpha=0.3)
         plt.legend()
         
@@ -223,8 +947,8 @@ class GraphEvaluator:
         plt.gca().xaxis.set_major_locator(mdates.AutoDateLocator())
         plt.gcf().autofmt_xdate()
         
-        # Set y-axis limits
-        plt.ylim(0, 1)
+        # Set y-axis limits (rank correlation can be negative)
+        plt.ylim(-1 if 'rank_corr' in self.metrics else 0, 1)
         
         # Save the plot
         os.makedirs(os.path.dirname(save_path), exist_ok=True)
@@ -233,16 +957,106 @@ class GraphEvaluator:
         
         print(f"Plot saved to {save_path}")
 
-    def run_evaluation(self, save_path: str, max_workers: Optional[int] = None) -> None:
+    def run_evaluation(self, save_path: str, max_workers: Optional[int] = None, use_threads: bool = False) -> None:
         """
         Run the full evaluation process and save the plot.
         
         Args:
             save_path: Path to save the plot
             max_workers: Maximum number of worker threads/processes
+            use_threads: Use a thread pool instead of a process pool
         """
         print(f"Starting evaluation with {len(self.dates)} dates from years {self.start_year} to {self.end_year}")
-        results = self.evaluate_all_dates(max_workers)
+        results = self.evaluate_all_dates(max_workers, use_threads=use_threads)
         print(f"Evaluation complete, plotting results")
         self.plot_results(results, save_path)
         print(f"Evaluation finished!")
+
+
+# Evaluator rebuilt once per worker process by _init_worker
+_WORKER_EVALUATOR: Optional[GraphEvaluator] = None
+
+
+def _init_worker(config: Dict) -> None:
+    """Process pool initializer: build the worker's evaluator from its config."""
+    global _WORKER_EVALUATOR
+    _WORKER_EVALUATOR = GraphEvaluator(**config)
+
+
+def _evaluate_chunk(evaluator: GraphEvaluator, dates: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Evaluate a chunk of dates.
+    
+    Returns:
+        Tuple of (metric values per date, shape (len(dates), len(metric_labels)),
+        whether each date was processed successfully)
+    """
+    values = np.full((len(dates), len(evaluator.metric_labels)), np.nan)
+    ok = np.zeros(len(dates), dtype=bool)
+    for i, date in enumerate(dates):
+        _, metrics = evaluator.process_date(date)
+        if metrics:
+            values[i] = [metrics[label] for label in evaluator.metric_labels]
+            ok[i] = True
+    return values, ok
+
+
+def _evaluate_chunk_in_worker(dates: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Evaluate a chunk of dates with the evaluator built by _init_worker."""
+    return _evaluate_chunk(_WORKER_EVALUATOR, dates)
+
+
+def convert_to_topk(root: str,
+                    k: int = GraphEvaluator.TOP_K,
+                    start_year: int = None,
+                    end_year: int = None,
+                    overwrite: bool = False) -> List[str]:
+    """
+    Write top-K neighbour lists next to every dense adjacency matrix under root.
+    
+    For each <root>/<year>/<date>.feather a <date>.topk.npz is written in the same
+    directory, and new stock codes are appended to <root>/stock_codes.npy.
+    
+    Args:
+        root: Directory containing <year>/<date>.feather adjacency matrices
+        k: Number of neighbours to keep per stock (at least the largest k evaluated)
+        start_year: Starting year to convert (inclusive)
+        end_year: Ending year to convert (inclusive)
+        overwrite: Rebuild top-K files that already exist (files older than their
+            dense matrix are always rebuilt)
+        
+    Returns:
+        List of converted dates
+    """
+    root = Path(root)
+    codes = _load_stock_codes(root)
+    converted = []
+    
+    for dense_file in sorted(root.glob("*/*.feather")):
+        date = dense_file.stem
+        try:
+            year = int(date[:4])
+        except ValueError:
+            continue
+        if ((start_year is not None and year < start_year) or
+                (end_year is not None and year > end_year)):
+            continue
+        topk_file = dense_file.with_name(f"{date}{TopKGraph.SUFFIX}")
+        if _topk_is_current(topk_file, dense_file) and not overwrite:
+            continue
+        
+        index, columns = _read_feather_layout(dense_file)
+        column_set = set(columns)
+        df = _read_feather_block(dense_file, index, [s for s in index if s in column_set])
+        
+        # Extend the dictionary before writing any file that refers to the new ids
+        new_codes = index[~index.isin(codes)]
+        if len(new_codes):
+            codes = np.concatenate([codes, np.asarray(new_codes, dtype=str)])
+            np.save(root / TopKGraph.CODES_FILE, codes, allow_pickle=False)
+        
+        TopKGraph.from_dense(df, codes, k, GraphEvaluator.BLOCK_SIZE).save(topk_file)
+        converted.append(date)
+        print(f"Converted date: {date}")
+    
+    return converted
@@ -1,12 +1,39 @@
 import json
+import hashlib
 from pathlib import Path
+import numpy as np
 import pandas as pd
+import pyarrow.dataset as ds
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_pdf import PdfPages
 from multiprocessing import Pool, cpu_count
+from multiprocessing.shared_memory import SharedMemory
+from scipy.stats import rankdata
 from util.TradingDate import TradingDate
 from util import dir_range
 
+# Merged panel attached by each worker process in Evaluator_l1.init_worker
+_SHARED_PANEL = {}
+# Figure reused by each plotting worker process, created in Evaluator_l1.init_plot_worker
+_PLOT_FIGURE = {}
+
+
 class Evaluator_l1:
+    # Number of features whose ICs are computed together in one task
+    IC_BATCH_SIZE = 16
+    # Rows (whole dates) whose ICs are computed together, bounding the per-task temporaries
+    # to a few hundred MB for IC_BATCH_SIZE features
+    IC_BLOCK_ROWS = 250_000
+    # Default number of IC worker processes; every worker holds its own block temporaries
+    IC_PROCESSES = 8
+    # Number of features rendered per plotting task
+    PLOT_BATCH_SIZE = 32
+    # IC series plotted for every feature, in legend order
+    SERIES_LABELS = {'ic': 'Full IC', 'positive_ic': 'Positive IC',
+                     'negative_ic': 'Negative IC', 'rank_ic': 'Rank IC'}
+    # Per-feature hashes of the plotted IC series, kept next to the figures
+    PLOT_HASH_FILE = '_plot_hashes.json'
+
     def __init__(self, pool_name, feature_list, label_name):
         self.pool_name = pool_name
         self.label_name = label_name
@@ -20,54 +47,411 @@ class Evaluator_l1:
         self.output_path = Path(config['output_path'])
 
     @staticmethod
-    def calculate_ic_positive(group, feature):
-        """Calculate IC for top half of sorted feature values"""
-        sorted_group = group.sort_values(by=feature)
-        half = sorted_group.iloc[len(sorted_group)//2:]
-        return half['label'].corr(half[feature])
+    def segment_corr(x, y, mask, starts, counts):
+        """Pearson correlation of x and y over masked rows, per date segment and column"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            n = np.add.reduceat(mask, starts, axis=0)
+            mean_x = np.add.reduceat(np.where(mask, x, 0.0), starts, axis=0) / n
+            mean_y = np.add.reduceat(np.where(mask, y, 0.0), starts, axis=0) / n
+            # Centre before multiplying, as pandas does, to keep raw-scale features accurate
+            dx = np.where(mask, x - np.repeat(mean_x, counts, axis=0), 0.0)
+            dy = np.where(mask, y - np.repeat(mean_y, counts, axis=0), 0.0)
+            cov = np.add.reduceat(dx * dy, starts, axis=0)
+            var_x = np.add.reduceat(dx * dx, starts, axis=0)
+            var_y = np.add.reduceat(dy * dy, starts, axis=0)
+            corr = cov / np.sqrt(var_x * var_y)
+        corr[n < 2] = np.nan
+        return corr
+
+    @staticmethod
+    def calculate_ic_batch(date, label, values, rank_ic=False, forward_rows=None, prev_rows=None,
+                           block_rows=None):
+        """
+        Calculate daily IC for a batch of features at once
+        :param date: (n,) date of every row, rows already sorted by date
+        :param label: (n,) label values
+        :param values: (n, n_features) feature values
+        :param rank_ic: also calculate Spearman rank IC
+        :param forward_rows: {horizon: (n,) row of the same stock horizon dates later, -1 if none},
+                             for IC decay
+        :param prev_rows: (n,) row of the same stock on the previous date, -1 if none,
+                          for factor autocorrelation and turnover
+        :param block_rows: rows of whole dates processed together, IC_BLOCK_ROWS if None; bounds the
+                           size of the (rows, n_features) temporaries
+        :return: (unique dates, dict of (n_dates, n_features) arrays: 'ic' over the full
+                 cross-section, 'positive_ic'/'negative_ic' over the top/bottom half of
+                 feature values, 'rank_ic' if requested, 'ic_lag<h>' (feature against the
+                 label h dates later) per forward horizon, and 'autocorr' (against the
+                 feature's previous value) and 'turnover' (share of the top half that was
+                 not in the top half on the previous date) if prev_rows is given)
+
+        The top/bottom halves are the len // 2 split of the date's valid rows sorted by feature
+        value; rows with tied values are ordered by row, i.e. by stock id in a (date, stock id)
+        sorted panel, which backtest assigns in ascending STOCK_CODE order. The original pandas
+        version split ties in the unspecified order of an unstable sort over merged rows, so
+        positive_ic/negative_ic of features with ties at the median (e.g. bucketed factors) differ
+        from it; features without such ties give the same values.
+        """
+        block_rows = block_rows or Evaluator_l1.IC_BLOCK_ROWS
+        bounds = np.r_[np.flatnonzero(np.r_[True, date[1:] != date[:-1]]), len(date)]
+        n_dates = len(bounds) - 1
+
+        blocks = {}
+        first = 0
+        while first < n_dates:
+            # Whole dates up to block_rows rows (at least one date), plus the previous date as
+            # context so that autocorrelation and turnover of the first date see their previous rows
+            stop = np.searchsorted(bounds, bounds[first] + block_rows, side='right') - 1
+            last = min(max(first + 1, stop), n_dates)
+            context = 1 if first > 0 and prev_rows is not None else 0
+            lo, hi = bounds[first - context], bounds[last]
+            block_forward = {horizon: np.where(rows[lo:hi] >= 0, label[rows[lo:hi]], np.nan)
+                             for horizon, rows in (forward_rows or {}).items()}
+            block_prev = None
+            if prev_rows is not None:
+                block_prev = prev_rows[lo:hi] - lo
+                block_prev[block_prev < 0] = -1
+            ics = Evaluator_l1._ic_block(date[lo:hi], label[lo:hi], values[lo:hi], rank_ic,
+                                            block_forward, block_prev)
+            for name, block in ics.items():
+                blocks.setdefault(name, []).append(block[context:])
+            first = last
+
+        ics = {name: np.concatenate(parts, axis=0) for name, parts in blocks.items()}
+        return date[bounds[:-1]], ics
+
+    @staticmethod
+    def _ic_block(date, label, values, rank_ic, forward_labels, prev_rows):
+        """
+        Daily ICs of calculate_ic_batch over a contiguous block of whole dates
+        :param forward_labels: {horizon: (n,) label of the same stock horizon dates later, NaN if none}
+        :param prev_rows: (n,) row of the same stock on the previous date within the block, -1 if none
+        :return: dict of (n_dates, n_features) arrays, as in calculate_ic_batch
+        """
+        starts = np.flatnonzero(np.r_[True, date[1:] != date[:-1]])
+        bounds = np.r_[starts, len(date)]
+        counts = np.diff(bounds)
+        labels = np.broadcast_to(label[:, None], values.shape)
+        valid = ~np.isnan(values) & ~np.isnan(labels)
+
+        # Position of every valid value in ascending feature order within its date
+        # (one 2-D sort per date covers all features; invalid values sort last)
+        masked = np.where(valid, values, np.nan)
+        position = np.empty(values.shape, dtype=np.int64)
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            order = np.argsort(masked[start:stop], axis=0, kind='stable')
+            np.put_along_axis(position[start:stop], order, np.arange(stop - start)[:, None], axis=0)
+        half = np.repeat(np.add.reduceat(valid, starts, axis=0) // 2, counts, axis=0)
+
+        ics = {
+            'ic': Evaluator_l1.segment_corr(values, labels, valid, starts, counts),
+            'positive_ic': Evaluator_l1.segment_corr(values, labels, valid & (position >= half), starts, counts),
+            'negative_ic': Evaluator_l1.segment_corr(values, labels, valid & (position < half), starts, counts),
+        }
+
+        if rank_ic:
+            masked_labels = np.where(valid, labels, np.nan)
+            value_ranks = np.empty(values.shape)
+            label_ranks = np.empty(values.shape)
+            for start, stop in zip(bounds[:-1], bounds[1:]):
+                value_ranks[start:stop] = rankdata(masked[start:stop], axis=0, nan_policy='omit')
+                label_ranks[start:stop] = rankdata(masked_labels[start:stop], axis=0, nan_policy='omit')
+            ics['rank_ic'] = Evaluator_l1.segment_corr(value_ranks, label_ranks, valid, starts, counts)
+
+        for horizon, later in forward_labels.items():
+            later = np.broadcast_to(later[:, None], values.shape)
+            mask = ~np.isnan(values) & ~np.isnan(later)
+            ics[f'ic_lag{horizon}'] = Evaluator_l1.segment_corr(values, later, mask, starts, counts)
+
+        if prev_rows is not None:
+            has_prev = (prev_rows >= 0)[:, None]
+            previous = np.where(has_prev, values[prev_rows], np.nan)
+            mask = ~np.isnan(values) & ~np.isnan(previous)
+            ics['autocorr'] = Evaluator_l1.segment_corr(values, previous, mask, starts, counts)
+
+            top = valid & (position >= half)
+            stayed = top & has_prev & top[prev_rows]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                turnover = 1 - np.add.reduceat(stayed, starts, axis=0) / np.add.reduceat(top, starts, axis=0)
+            turnover[np.add.reduceat(top & has_prev, starts, axis=0) == 0] = np.nan
+            ics['turnover'] = turnover
+
+        return ics
+
+    @staticmethod
+    def lag_rows(date, stock, lag):
+        """
+        Row of the same stock lag dates later (earlier if negative), -1 if absent
+        :param date: (n,) date of every row, rows sorted by date then stock
+        :param stock: (n,) integer stock id of every row
+        """
+        date_idx = np.cumsum(np.r_[False, date[1:] != date[:-1]])
+        n_stocks = int(stock.max()) + 1 if len(stock) else 1
+        keys = date_idx * n_stocks + stock
+        target = (date_idx + lag) * n_stocks + stock
+        pos = np.minimum(np.searchsorted(keys, target), max(len(keys) - 1, 0))
+        return np.where(keys[pos] == target, pos, -1) if len(keys) else pos
+
+    @staticmethod
+    def summarize_ic(results):
+        """
+        Summary table with one row per feature from the daily IC results
+        :param results: dict of IC DataFrames (dates x features) as returned by backtest
+        :return: DataFrame of mean IC, IC std, ICIR, t-stat, hit rate, mean positive/negative
+                 half IC, mean rank IC, mean IC at every decay horizon, mean factor
+                 autocorrelation and mean top-half turnover
+        """
+        ic = results['ic']
+        n = ic.count()
+        summary = pd.DataFrame({
+            'mean_ic': ic.mean(),
+            'ic_std': ic.std(),
+            'n_dates': n,
+        })
+        summary['icir'] = summary['mean_ic'] / summary['ic_std']
+        summary['t_stat'] = summary['icir'] * np.sqrt(n)
+        summary['hit_rate'] = (ic > 0).sum() / n
+        for name in ['positive_ic', 'negative_ic', 'rank_ic']:
+            if name in results:
+                summary[f'mean_{name}'] = results[name].mean()
+        decay = sorted((int(name[len('ic_lag'):]), name) for name in results if name.startswith('ic_lag'))
+        for _, name in decay:
+            summary[f'mean_{name}'] = results[name].mean()
+        for name in ['autocorr', 'turnover']:
+            if name in results:
+                summary[f'mean_{name}'] = results[name].mean()
+        summary.index.name = 'feature'
+        return summary
+
+    @staticmethod
+    def date_to_int(dates):
+        """Convert a date column (datetime, yyyymmdd int or yyyymmdd str) to int32 yyyymmdd"""
+        if pd.api.types.is_datetime64_any_dtype(dates):
+            return (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).to_numpy(dtype=np.int32)
+        return dates.astype(np.int64).to_numpy(dtype=np.int32)
+
+    @staticmethod
+    def sorted_order(keys):
+        """Permutation that sorts keys, or None if they are already sorted"""
+        if len(keys) < 2 or (keys[1:] >= keys[:-1]).all():
+            return None
+        return np.argsort(keys, kind='stable')
+
+    @staticmethod
+    def align_panel(pool, label_df):
+        """
+        Inner join of feature pool rows and label rows on (date, STOCK_CODE)
+        Both sides are keyed by date * n_stocks + stock id (int32 yyyymmdd date, stock codes
+        dictionary-encoded once in ascending code order), so the join is a merge of two sorted
+        int64 key arrays instead of a hash merge on string/datetime columns. Inputs that are
+        already in (date, STOCK_CODE) order, as daily pool files usually are, are not sorted again.
+        :return: (int32 yyyymmdd date, int64 stock id, pool row positions, label row positions)
+                 of every matched row, ordered by date then stock id
+        """
+        # Sorted codes: stock ids follow STOCK_CODE, which also breaks ties in the IC half split
+        stock_ids, stocks = pd.factorize(label_df['STOCK_CODE'], sort=True)
+        pool_stock_ids = stocks.get_indexer(pool['STOCK_CODE'])
+        n_stocks = max(len(stocks), 1)
+
+        label_keys = Evaluator_l1.date_to_int(label_df['date']).astype(np.int64) * n_stocks + stock_ids
+        label_rows = np.flatnonzero(stock_ids >= 0)
+        order = Evaluator_l1.sorted_order(label_keys[label_rows])
+        if order is not None:
+            label_rows = label_rows[order]
+        label_keys = label_keys[label_rows]
+        if (label_keys[1:] == label_keys[:-1]).any():
+            raise ValueError("Labels contain duplicate (date, STOCK_CODE) rows")
+
+        pool_keys = Evaluator_l1.date_to_int(pool['date']).astype(np.int64) * n_stocks + pool_stock_ids
+        pool_rows = np.flatnonzero(pool_stock_ids >= 0)
+        order = Evaluator_l1.sorted_order(pool_keys[pool_rows])
+        if order is not None:
+            pool_rows = pool_rows[order]
+        pool_keys = pool_keys[pool_rows]
+
+        # Sorted queries against sorted keys: every lookup continues where the last stopped
+        pos = np.searchsorted(label_keys, pool_keys)
+        pos[pos == len(label_keys)] = 0
+        matched = label_keys[pos] == pool_keys if len(label_keys) else np.zeros(len(pool_keys), dtype=bool)
+        pool_rows, pos, pool_keys = pool_rows[matched], pos[matched], pool_keys[matched]
+        return (pool_keys // n_stocks).astype(np.int32), pool_keys % n_stocks, pool_rows, label_rows[pos]
+
+    @staticmethod
+    def panel_arrays(buffer, n_rows, n_features, n_horizons):
+        """
+        View a shared panel buffer as (date, stock, label, lags, values) arrays without copying.
+        Layout: int64 date codes, int64 stock ids, float64 labels, int64 lag maps (row of the same
+        stock on the previous date, then one row per forward horizon, as returned by lag_rows), then
+        float64 features in column-major order so that every feature column (and every batch of
+        columns) is contiguous.
+        """
+        date = np.ndarray((n_rows,), dtype=np.int64, buffer=buffer)
+        stock = np.ndarray((n_rows,), dtype=np.int64, buffer=buffer, offset=8 * n_rows)
+        label = np.ndarray((n_rows,), dtype=np.float64, buffer=buffer, offset=16 * n_rows)
+        lags = np.ndarray((1 + n_horizons, n_rows), dtype=np.int64, buffer=buffer, offset=24 * n_rows)
+        values = np.ndarray((n_rows, n_features), dtype=np.float64, buffer=buffer,
+                            offset=8 * n_rows * (4 + n_horizons), order='F')
+        return date, stock, label, lags, values
 
     @staticmethod
-    def calculate_ic_negative(group, feature):
-        """Calculate IC for bottom half of sorted feature values"""
-        sorted_group = group.sort_values(by=feature)
-        half = sorted_group.iloc[:len(sorted_group)//2]
-        return half['label'].corr(half[feature])
+    def init_worker(shm_name, n_rows, n_features, horizons):
+        """Pool initializer: attach the shared panel and its lag maps once per worker process"""
+        shm = SharedMemory(name=shm_name)
+        date, _, label, lags, values = Evaluator_l1.panel_arrays(shm.buf, n_rows, n_features, len(horizons))
+        _SHARED_PANEL['shm'] = shm
+        _SHARED_PANEL['arrays'] = date, label, values
+        _SHARED_PANEL['prev_rows'] = lags[0]
+        _SHARED_PANEL['forward_rows'] = dict(zip(horizons, lags[1:]))
 
     @staticmethod
-    def process_feature(args):
-        """Parallel processing function for a single feature"""
-        feature, feature_df = args
-        
-        # Clean data for this feature
-        df = feature_df.dropna(subset=[feature, 'label'])
-        if df.empty:
-            return feature, None, None, None, None
-
-        # Calculate correlations
+    def process_feature_batch(args):
+        """Parallel processing function for a batch of feature columns of the shared panel"""
+        start, stop, rank_ic = args
+        date, label, values = _SHARED_PANEL['arrays']
+
         try:
-            ic = df.groupby('date').apply(lambda x: x['label'].corr(x[feature]))
-            positive_ic = df.groupby('date').apply(
-                lambda g: Evaluator_l1.calculate_ic_positive(g, feature)
-            )
-            negative_ic = df.groupby('date').apply(
-                lambda g: Evaluator_l1.calculate_ic_negative(g, feature)
+            _, ics = Evaluator_l1.calculate_ic_batch(
+                date, label, values[:, start:stop], rank_ic=rank_ic,
+                forward_rows=_SHARED_PANEL['forward_rows'], prev_rows=_SHARED_PANEL['prev_rows']
             )
         except Exception as e:
-            print(f"Error processing {feature}: {str(e)}")
-            return feature, None, None, None, None
+            print(f"Error processing features {start}-{stop}: {str(e)}")
+            return start, stop, None
+
+        return start, stop, ics
 
-        return feature, ic, positive_ic, negative_ic
+    @staticmethod
+    def draw_cumulative_ic(ax, feature, series):
+        """Draw the cumulative IC chart of one feature on ax (cleared first)"""
+        ax.clear()
+        ax.set_title(f'Cumulative IC - {feature}')
+        for name, label in Evaluator_l1.SERIES_LABELS.items():
+            if name in series:
+                ax.plot(series[name].index, series[name].cumsum(), label=label)
+        ax.legend()
+        ax.grid(True)
+        ax.set_ylabel('Cumulative IC')
 
-    def backtest(self):
-        """Main analysis pipeline with parallel processing"""
+    @staticmethod
+    def series_hash(series):
+        """Hash of a feature's IC series, to detect unchanged figures"""
+        digest = hashlib.sha1()
+        for name in sorted(series):
+            digest.update(name.encode())
+            digest.update(np.asarray(series[name].index, dtype='datetime64[ns]').tobytes())
+            digest.update(np.ascontiguousarray(series[name].to_numpy(dtype=np.float64)).tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def init_plot_worker():
+        """Pool initializer: render off-screen and create the figure reused for every chart"""
+        plt.switch_backend('Agg')
+        _PLOT_FIGURE['fig'], _PLOT_FIGURE['ax'] = plt.subplots(figsize=(12, 6))
+
+    @staticmethod
+    def plot_feature_batch(args):
+        """Parallel plotting function for a batch of features"""
+        items, plot_dir = args
+        fig, ax = _PLOT_FIGURE['fig'], _PLOT_FIGURE['ax']
+        for feature, series in items:
+            Evaluator_l1.draw_cumulative_ic(ax, feature, series)
+            fig.savefig(plot_dir / f'{feature}.png', bbox_inches='tight')
+        return [feature for feature, _ in items]
+
+    def plot_results(self, results, plot_dir, processes=None, report=None):
+        """
+        Render one cumulative IC chart per feature
+        Charts are drawn in a process pool on the Agg backend, each worker reusing a
+        single figure, and a chart is skipped when its IC series are unchanged since
+        the last run (and its PNG still exists).
+        :param results: dict of IC DataFrames (dates x features) as returned by backtest
+        :param plot_dir: directory for the PNGs
+        :param processes: number of worker processes, cpu_count() if None
+        :param report: also write every chart to a single 'pdf' (multi-page) or an
+                       'html' page referencing the PNGs, or None
+        """
+        plot_dir = Path(plot_dir)
+        plot_dir.mkdir(parents=True, exist_ok=True)
+        hash_path = plot_dir / self.PLOT_HASH_FILE
+        old_hashes = json.load(open(hash_path, 'r')) if hash_path.exists() else {}
+
+        items, hashes = [], {}
+        for feature in self.feature_list:
+            if 'ic' not in results or feature not in results['ic'] or results['ic'][feature].isna().all():
+                print(f"Skipping {feature} - no valid data")
+                continue
+            series = {name: results[name][feature].dropna()
+                      for name in self.SERIES_LABELS if name in results}
+            hashes[feature] = self.series_hash(series)
+            items.append((feature, series))
+
+        stale = [(feature, series) for feature, series in items
+                 if old_hashes.get(feature) != hashes[feature] or not (plot_dir / f'{feature}.png').exists()]
+        print(f"Plotting {len(stale)} features, {len(items) - len(stale)} unchanged")
+        if stale:
+            tasks = [(stale[i:i + self.PLOT_BATCH_SIZE], plot_dir)
+                     for i in range(0, len(stale), self.PLOT_BATCH_SIZE)]
+            with Pool(processes=min(processes or cpu_count(), len(tasks)),
+                      initializer=self.init_plot_worker) as workers:
+                workers.map(self.plot_feature_batch, tasks)
+        with open(hash_path, 'w') as f:
+            json.dump(hashes, f)
+
+        if report == 'pdf':
+            pdf_path = plot_dir / f'{self.pool_name}_ic.pdf'
+            if stale or not pdf_path.exists():
+                fig, ax = plt.subplots(figsize=(12, 6))
+                with PdfPages(pdf_path) as pdf:
+                    for feature, series in items:
+                        self.draw_cumulative_ic(ax, feature, series)
+                        pdf.savefig(fig, bbox_inches='tight')
+                plt.close(fig)
+        elif report == 'html':
+            with open(plot_dir / f'{self.pool_name}_ic.html', 'w') as f:
+                f.write(f'<html><head><title>Cumulative IC - {self.pool_name}</title></head><body>\n')
+                for feature, _ in items:
+                    f.write(f'<h3>{feature}</h3><img src="{feature}.png" width="960">\n')
+                f.write('</body></html>\n')
+        elif report is not None:
+            raise ValueError(f"Unknown report format: {report}")
+
+    def load_labels(self, start_date, end_date):
+        """
+        Load STOCK_CODE, date and the label for start_date <= DataDate <= end_date
+        Only these columns are read, and the DataDate predicate is applied in the Arrow
+        scan, so the many other label columns are never decoded. universe.feather may
+        also be a directory of hive-partitioned files (e.g. year=2019/...), in which
+        case partitions outside the window are skipped entirely.
+        :param start_date: first DataDate, yyyymmdd
+        :param end_date: last DataDate, yyyymmdd
+        """
+        path = self.uni_path / 'all' / "universe.feather"
+        dataset = ds.dataset(path, format='ipc', partitioning='hive' if path.is_dir() else None)
+        window = (ds.field('DataDate') >= int(start_date)) & (ds.field('DataDate') <= int(end_date))
+        table = dataset.to_table(columns=['STOCK_CODE', 'date', self.label_name], filter=window)
+        return table.to_pandas()
+
+    def backtest(self, rank_ic=False, processes=None, start_date='20190101', end_date='20241231', report=None,
+                 decay_horizons=(1, 5, 10, 20)):
+        """
+        Main analysis pipeline with parallel processing
+        :param rank_ic: also calculate and plot Spearman rank IC
+        :param processes: number of worker processes, min(cpu_count(), IC_PROCESSES) if None
+        :param start_date: first date of the backtest, yyyymmdd
+        :param end_date: last date of the backtest, yyyymmdd
+        :param report: also write a single 'pdf' or 'html' report of all charts, or None
+        :param decay_horizons: horizons, in dates, of the IC decay columns of the summary
+        :return: dict of daily IC DataFrames (dates x features); the per-feature summary table
+                 is saved as <pool_name>_ic_summary.feather in the output directory
+        """
         td = TradingDate()
-        dt_range = td.get_trading_date_range('2019-01-01', '2024-12-31')
+        dt_range = td.get_trading_date_range(
+            f'{start_date[:4]}-{start_date[4:6]}-{start_date[6:]}',
+            f'{end_date[:4]}-{end_date[4:6]}-{end_date[6:]}'
+        )
 
         # Load and prepare data
-        label_df = pd.read_feather(self.uni_path / 'all' / "universe.feather")
-        label_df = label_df.query('20190101 <= DataDate <= 20241231')
-
-        label_df = label_df[['STOCK_CODE', 'date', self.label_name]]
+        label_df = self.load_labels(start_date, end_date)
 
         # Load features and merge once
         pool = dir_range.read_date_range_feather(
@@ -76,42 +460,59 @@ class Evaluator_l1:
             date_range=dt_range
         )
 
-        pool['date'] = pd.to_datetime(pool['date'].astype(str), format='%Y%m%d')
-        merged = pd.merge(pool, label_df, on=['date', 'STOCK_CODE'], how='inner')
-
-        # Prepare feature-specific DataFrames
-        feature_data = [
-            (feature, merged[['date', feature, self.label_name]].copy())
-            for feature in self.feature_list
-        ]
+        # Join on integer keys; the result is ordered by date, so every IC is then a
+        # reduction over contiguous date segments
+        panel_date, panel_stock, pool_rows, label_rows = self.align_panel(pool, label_df)
+        n_rows, n_features = len(pool_rows), len(self.feature_list)
 
         # Create output directory
         output_dir = self.output_path / self.pool_name
         output_dir.mkdir(parents=True, exist_ok=True)
 
-        # Parallel processing
-        with Pool(processes=8) as pool:
-            results = pool.map(self.process_feature, feature_data)
+        # Copy the panel and its lag maps into shared memory once; workers only receive
+        # feature index ranges
+        decay_horizons = tuple(decay_horizons)
+        shm = SharedMemory(create=True, size=max(8 * n_rows * (4 + len(decay_horizons) + n_features), 1))
+        try:
+            date, stock, label, lags, values = self.panel_arrays(shm.buf, n_rows, n_features, len(decay_horizons))
+            date[:] = panel_date
+            stock[:] = panel_stock
+            label[:] = label_df[self.label_name].to_numpy(dtype=np.float64)[label_rows]
+            for i, lag in enumerate((-1,) + decay_horizons):
+                lags[i] = self.lag_rows(date, stock, lag)
+            for j, feature in enumerate(self.feature_list):
+                values[:, j] = pool[feature].to_numpy(dtype=np.float64)[pool_rows]
+            unique_dates = pd.to_datetime(np.unique(panel_date).astype(str), format='%Y%m%d')
+            del pool, label_df, date, stock, label, lags, values
+
+            tasks = [
+                (i, min(i + self.IC_BATCH_SIZE, n_features), rank_ic)
+                for i in range(0, n_features, self.IC_BATCH_SIZE)
+            ]
 
-        # Process results and generate plots
-        for result in results:
-            feature, ic, pos_ic, neg_ic = result
-            if ic is None:
-                print(f"Skipping {feature} - no valid data")
+            # Parallel processing
+            with Pool(processes=processes or min(cpu_count(), self.IC_PROCESSES), initializer=self.init_worker,
+                      initargs=(shm.name, n_rows, n_features, decay_horizons)) as workers:
+                batch_results = workers.map(self.process_feature_batch, tasks)
+        finally:
+            shm.close()
+            shm.unlink()
+
+        results = {}
+        for start, stop, ics in batch_results:
+            if ics is None:
                 continue
+            for name, batch_values in ics.items():
+                frame = pd.DataFrame(batch_values, index=unique_dates, columns=self.feature_list[start:stop])
+                results.setdefault(name, []).append(frame)
+        results = {name: pd.concat(frames, axis=1) for name, frames in results.items()}
+
+        # Summary table from the same pass
+        if 'ic' in results:
+            summary = self.summarize_ic(results)
+            summary.reset_index().to_feather(output_dir / f'{self.pool_name}_ic_summary.feather')
+
+        # Generate plots
+        self.plot_results(results, output_dir / self.pool_name, processes=processes, report=report)
 
-            # Generate plot
-            plt.figure(figsize=(12, 6))
-            plt.title(f'Cumulative IC - {feature}')
-            for series, label in zip(
-                [ic, pos_ic, neg_ic],
-                ['Full IC', 'Positive IC', 'Negative IC']
-            ):
-                plt.plot(series.index, series.cumsum(), label=label)
-            
-            plt.legend()
-            plt.grid(True)
-            plt.ylabel('Cumulative IC')
-            fig_save_path = output_dir / self.pool_name / f'{feature}.png'
-            plt.savefig(fig_save_path, bbox_inches='tight')
-            plt.close()
+        return results
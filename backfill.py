@@ -0,0 +1,118 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+# Factor instance of the current worker process, created once by _init_worker
+_WORKER_FACTOR = None
+
+
+def _init_worker(factory, factory_kwargs):
+    """Pool initializer: build one factor instance per worker, so its caches persist across chunks"""
+    global _WORKER_FACTOR
+    _WORKER_FACTOR = factory(**factory_kwargs)
+
+
+def output_file(output_dir, date):
+    return Path(output_dir) / f'{date}.feather'
+
+
+def pending_dates(dates, output_dir):
+    """Dates of the range without a written output, in date order"""
+    return [date for date in sorted(dates) if not output_file(output_dir, date).exists()]
+
+
+def split_chunks(dates, chunk_size):
+    """Split sorted dates into contiguous chunks of at most chunk_size dates"""
+    return [dates[start:start + chunk_size] for start in range(0, len(dates), chunk_size)]
+
+
+def _write_output(frame, output_dir, date):
+    """Write one date's factors atomically, so a partial file never counts as completed"""
+    path = output_file(output_dir, date)
+    tmp_path = path.with_name(path.name + '.tmp')
+    frame.reset_index(drop=True).to_feather(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _compute(factor, dates):
+    """{date: factors} of a batch of dates, using the factor's multi-date path when it has one"""
+    if hasattr(factor, 'calculate_cross_section_factors_batch'):
+        return factor.calculate_cross_section_factors_batch(dates)
+    return {date: factor.calculate_cross_section_factors(date) for date in dates}
+
+
+def _run_chunk(dates, output_dir, batch_size):
+    """
+    Compute and write a contiguous chunk of dates in the worker process
+    :return: (completed dates, [(date, error message)] of failed dates)
+    """
+    factor = _WORKER_FACTOR
+    if hasattr(factor, 'prepare_dates'):
+        factor.prepare_dates(dates)
+
+    completed, failed = [], []
+    for start in range(0, len(dates), batch_size):
+        batch = dates[start:start + batch_size]
+        try:
+            results = _compute(factor, batch)
+        except Exception:
+            # Retry one date at a time so that a bad date only loses itself
+            results = {}
+            for date in batch:
+                try:
+                    results.update(_compute(factor, [date]))
+                except Exception as e:
+                    failed.append((date, str(e)))
+        for date in batch:
+            if date in results:
+                _write_output(results[date], output_dir, date)
+                completed.append(date)
+    return completed, failed
+
+
+def backfill(factory, dates, output_dir, processes=None, chunk_size=None, batch_size=20, factory_kwargs=None):
+    """
+    Compute a daily factor class over many dates in parallel, writing <output_dir>/<date>.feather per date.
+    Dates whose output already exists are skipped, so a restarted backfill resumes where it stopped.
+
+    :param factory: picklable callable returning the factor instance (e.g. a _PoolBaseDaily subclass);
+                    called once per worker. The instance needs calculate_cross_section_factors(date)
+                    or calculate_cross_section_factors_batch(dates), and may define prepare_dates(dates),
+                    which is called with each chunk before it is computed
+    :param dates: dates to compute
+    :param output_dir: directory of the per-date outputs
+    :param processes: number of worker processes, default os.cpu_count()
+    :param chunk_size: dates per contiguous chunk, default about four chunks per worker
+    :param batch_size: dates computed together inside a chunk before their outputs are written
+    :param factory_kwargs: keyword arguments of factory
+    :return: (completed dates, [(date, error message)] of failed dates)
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    dates = pending_dates(dates, output_dir)
+    if not dates:
+        return [], []
+
+    processes = processes or os.cpu_count() or 1
+    chunk_size = chunk_size or max(1, -(-len(dates) // (processes * 4)))
+    chunks = split_chunks(dates, chunk_size)
+    print(f"Backfilling {len(dates)} dates in {len(chunks)} chunks on {processes} processes")
+
+    completed, failed = [], []
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                             initargs=(factory, factory_kwargs or {})) as executor:
+        futures = {executor.submit(_run_chunk, chunk, output_dir, batch_size): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            chunk = futures[future]
+            try:
+                chunk_completed, chunk_failed = future.result()
+            except Exception as e:
+                chunk_completed, chunk_failed = [], [(date, str(e)) for date in chunk]
+            completed.extend(chunk_completed)
+            failed.extend(chunk_failed)
+            print(f"Chunk {chunk[0]}..{chunk[-1]}: {len(chunk_completed)} written, {len(chunk_failed)} failed "
+                  f"({len(completed)}/{len(dates)} done)")
+
+    for date, error in sorted(failed):
+        print(f"Failed {date}: {error}")
+    return sorted(completed), sorted(failed)
@@ -0,0 +1,233 @@
+import ast
+import numpy as np
+
+# ================== 表达式函数 ==================
+def _group_position(n, group):
+    """每行在所属序列中的位置（group 为 None 时每行单独成序列）"""
+    if group is None:
+        return np.zeros(n, dtype=np.int64)
+    group = np.asarray(group)
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    counts = np.diff(np.r_[starts, n])
+    return np.arange(n) - np.repeat(starts, counts)
+
+def LAG(x, n, group=None):
+    """同一序列内 n 期之前的值，不足 n 期为 NaN"""
+    out = np.full_like(x, np.nan)
+    if n <= 0:
+        return x.copy() if n == 0 else out
+    valid = _group_position(len(x), group) >= n
+    out[valid] = x[np.flatnonzero(valid) - n]
+    return out
+
+def DELTA(x, n, group=None):
+    return x - LAG(x, n, group)
+
+def SUM(x, n, group=None):
+    """同一序列内最近 n 期之和（含当期），窗口不完整或含 NaN 时为 NaN"""
+    filled = np.cumsum(np.r_[0.0, np.nan_to_num(x, nan=0.0)])
+    missing = np.cumsum(np.r_[0, np.isnan(x)])
+    idx = np.arange(len(x))
+    start = np.maximum(idx + 1 - n, 0)
+    out = filled[idx + 1] - filled[start]
+    complete = (_group_position(len(x), group) >= n - 1) & (missing[idx + 1] == missing[start])
+    return np.where(complete, out, np.nan)
+
+def MEAN(x, n, group=None):
+    return SUM(x, n, group) / n
+
+# 名称 -> (函数, 序列参数个数, 是否为时序函数；时序函数最后一个参数为整数窗口)
+FUNCTIONS = {
+    'ABS': (np.abs, 1, False),
+    'LOG': (np.log, 1, False),
+    'SQRT': (np.sqrt, 1, False),
+    'SIGN': (np.sign, 1, False),
+    'NP_MAXIMUM': (np.maximum, 2, False),
+    'NP_MINIMUM': (np.minimum, 2, False),
+    'LAG': (LAG, 1, True),
+    'DELTA': (DELTA, 1, True),
+    'SUM': (SUM, 1, True),
+    'MEAN': (MEAN, 1, True),
+}
+
+_BINARY_OPS = {
+    ast.Add: ('add', np.add),
+    ast.Sub: ('sub', np.subtract),
+    ast.Mult: ('mul', np.multiply),
+    ast.Div: ('div', np.true_divide),
+    ast.Pow: ('pow', np.power),
+}
+_COMMUTATIVE = {'add', 'mul'}
+_OPERATORS = {name: func for name, func in _BINARY_OPS.values()}
+
+# ================== 表达式图 ==================
+class FactorGraph:
+    """
+    所有因子表达式共享的计算图：每个子表达式只保留一个节点（公共子表达式消除），
+    节点按创建顺序即为拓扑序，一次遍历完成全部因子的向量化计算
+    """
+
+    def __init__(self):
+        self.nodes = []      # (类型, 参数...)，子节点以编号引用
+        self._ids = {}       # 节点 -> 编号
+        self.outputs = {}    # 因子名 -> 节点编号
+        self.errors = {}     # 因子名 -> 编译错误
+
+    def _node(self, key):
+        if key not in self._ids:
+            self._ids[key] = len(self.nodes)
+            self.nodes.append(key)
+        return self._ids[key]
+
+    def _const(self, node_id):
+        key = self.nodes[node_id]
+        return key[1] if key[0] == 'const' else None
+
+    def _compile(self, tree, resolve):
+        if isinstance(tree, ast.Constant) and isinstance(tree.value, (int, float)) \
+                and not isinstance(tree.value, bool):
+            return self._node(('const', float(tree.value)))
+        if isinstance(tree, ast.Name):
+            return self._node(('col', resolve(tree.id)))
+        if isinstance(tree, ast.UnaryOp) and isinstance(tree.op, (ast.USub, ast.UAdd)):
+            operand = self._compile(tree.operand, resolve)
+            if isinstance(tree.op, ast.UAdd):
+                return operand
+            value = self._const(operand)
+            return self._node(('const', -value) if value is not None else ('neg', operand))
+        if isinstance(tree, ast.BinOp) and type(tree.op) in _BINARY_OPS:
+            op, func = _BINARY_OPS[type(tree.op)]
+            left, right = self._compile(tree.left, resolve), self._compile(tree.right, resolve)
+            if self._const(left) is not None and self._const(right) is not None:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    return self._node(('const', float(func(self._const(left), self._const(right)))))
+            if op in _COMMUTATIVE:
+                left, right = sorted((left, right))
+            return self._node((op, left, right))
+        if isinstance(tree, ast.Call) and isinstance(tree.func, ast.Name) and tree.func.id in FUNCTIONS \
+                and not tree.keywords:
+            name = tree.func.id
+            _, n_args, is_series = FUNCTIONS[name]
+            args = tree.args
+            if len(args) != n_args + is_series:
+                raise ValueError(f"{name} 参数个数错误")
+            window = ()
+            if is_series:
+                window = args[-1]
+                if not (isinstance(window, ast.Constant) and isinstance(window.value, int)):
+                    raise ValueError(f"{name} 的窗口参数必须为整数常量")
+                window = (window.value,)
+                args = args[:-1]
+            return self._node(('fn', name, window) + tuple(self._compile(arg, resolve) for arg in args))
+        raise ValueError(f"不支持的表达式: {ast.dump(tree)}")
+
+    def add(self, name, expression, resolve=None):
+        """
+        编译一个因子表达式并注册为输出
+        :param resolve: 变量名 -> 列名的映射函数，默认直接使用变量名
+        :return: 输出节点编号
+        """
+        tree = ast.parse(expression.strip(), mode='eval').body
+        node_id = self._compile(tree, resolve or (lambda col: col))
+        self.outputs[name] = node_id
+        return node_id
+
+    @property
+    def columns(self):
+        """计算所需的全部列名"""
+        return [key[1] for key in self.nodes if key[0] == 'col']
+
+    def evaluate(self, data, group=None, rows=None, outputs=None):
+        """
+        一次遍历计算全部因子
+        :param data: 列名 -> 一维数组的映射（如 DataFrame）
+        :param group: 时序函数的序列编号，同一序列的行需连续且按时间升序；
+                      为 None 时每行视为独立序列（LAG 等结果为 NaN）
+        :param rows: 只取这些行号、按此顺序计算（group 与之对应），结果按 data 原行位置写回，
+                     其余行为 NaN；data 需有 index
+        :param outputs: 只计算这些因子，默认全部
+        :return: 因子名 -> 数组；缺少所需字段的因子不在结果中
+        """
+        outputs = self.outputs if outputs is None else {name: self.outputs[name] for name in outputs}
+
+        # 只计算所需节点；记录每个节点最后一次被使用的位置，用完即释放中间结果
+        needed = set(outputs.values())
+        for i in range(len(self.nodes) - 1, -1, -1):
+            if i in needed:
+                needed.update(self._children(self.nodes[i]))
+        last_use = {}
+        for i in sorted(needed):
+            for child in self._children(self.nodes[i]):
+                last_use[child] = i
+        keep = set(outputs.values())
+
+        values = [None] * len(self.nodes)
+        n = len(data.index) if hasattr(data, 'index') else None
+        length = len(rows) if rows is not None else n
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            for i in sorted(needed):
+                key = self.nodes[i]
+                kind = key[0]
+                if kind == 'const':
+                    values[i] = key[1]
+                elif kind == 'col':
+                    if key[1] in data:
+                        values[i] = np.asarray(data[key[1]], dtype=float)
+                        if rows is not None:
+                            values[i] = values[i][rows]
+                else:
+                    args = [values[child] for child in self._children(key)]
+                    if any(arg is None for arg in args):
+                        values[i] = None
+                    elif kind == 'neg':
+                        values[i] = np.negative(args[0])
+                    elif kind == 'fn':
+                        func, _, is_series = FUNCTIONS[key[1]]
+                        if is_series:
+                            shape = (length,) if length is not None else np.shape(args[0])
+                            series = np.asarray(np.broadcast_to(args[0], shape), dtype=float)
+                            values[i] = func(series, *key[2], group=group)
+                        else:
+                            values[i] = func(*args)
+                    else:
+                        values[i] = _OPERATORS[kind](*args)
+                for child in self._children(key):
+                    if last_use[child] == i and child not in keep:
+                        values[child] = None
+
+        results = {}
+        for name, node_id in outputs.items():
+            value = values[node_id]
+            if value is None:
+                continue
+            if length is not None and np.ndim(value) == 0:
+                value = np.full(length, value, dtype=float)
+            if rows is not None:
+                restored = np.full(n, np.nan)
+                restored[rows] = value
+                value = restored
+            results[name] = value
+        return results
+
+    @staticmethod
+    def _children(key):
+        if key[0] in ('const', 'col'):
+            return ()
+        if key[0] == 'fn':
+            return key[3:]
+        return key[1:]
+
+def compile_factors(configs, resolve=None):
+    """
+    将一组因子配置编译为一个共享计算图
+    :param resolve: (config, 变量名) -> 列名，默认直接使用变量名
+    :return: FactorGraph，编译失败的因子记录在 errors 中
+    """
+    graph = FactorGraph()
+    for config in configs:
+        try:
+            config_resolve = (lambda col, config=config: resolve(config, col)) if resolve else None
+            graph.add(config['name'], config['expression'], config_resolve)
+        except (SyntaxError, ValueError) as e:
+            graph.errors[config['name']] = str(e)
+    return graph
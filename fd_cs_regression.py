@@ -2,24 +2,207 @@ import pandas as pd
 import numpy as np
 from factor.pool_base import _PoolBaseDaily
 from util.TradingDate import TradingDate
-from scipy.stats import norm
-import statsmodels.api as sm
+from itertools import groupby
+from norm_kernels import winsorize as winsorize_columns, gaussian_rank as gaussian_rank_columns, mad_clip
+
+# fin_main_ratio prepared by load_fin_main_ratio, read once per process and keyed by path
+_FIN_MAIN_RATIO_CACHE = {}
 
 class fd_cs_regression(_PoolBaseDaily):
 
+    REPORT_TYPES = [1081, 1083]
+    FIN_MAIN_RATIO_KEYS = ['STOCK_CODE', 'REPORT_YEAR', 'REPORT_QUARTER', 'REPORT_TYPE', 'UPDATETIME',
+                           'ENTRYTIME', 'DECLARE_DATE']
+    LAST4Q_COLUMNS = [
+        "GP_RATIO", "ROE", "ROA", "NF_MARGIN", "MAN_RATIO", "FE_RATIO", "MAR_RATIO", "TP_CE_RATIO", "EXP_RATIO",
+        "AR_TURNOVER", "INV_TURNOVER", "WC_TURNOVER", "TA_TURNOVER", "FA_TURNOVER", "CA_TURNOVER", "NA_TURNOVER",
+        "CA_RATIO", "MP_RATIO", "TMA_TATIO", "INV_RATIO", "FA_RATIO", "DS_RATIO", "DEBT_EQ_RATIO", "EQ_AS_RATIO",
+        "DEBT_AS_RATIO", "EQ_MULTIPLIER", "CUR_RATIO", "QUICK_RATIO", "CASH_RATIO", "INT_MULTIPLIER", "CD_RATIO",
+        "OR_GRATE_YOY", "OR_GRATE_OQ", "NP_GRATE_YOY", "NP_GRATE_OQ", "NA_GRATE_YOY", "NA_GRATE_OQ",
+        "FA_GRATE_YOY", "FA_GRATE_OQ", "OP_GRATE_YOY", "OP_GRATE_OQ", "NCFOA_CL_RATIO", "NCFOA_TL_RATIO",
+        "ICFOA_OR_RATIO", "ICFOA_OR_RATIO_TTM", "NCF_TA_RATIO", "NCF_TA_RATIO_TTM", "NCFOA_OR_RATIO",
+        "NCFOA_OR_RATIO_TTM", "NCFOA_NP_RATIO", "NCFOA_NP_RATIO_TTM"
+    ]
 
-    def load_daily_data(self, date):
-        td = TradingDate()
-        year = int(date[:4])
+    @staticmethod
+    def to_day(dates):
+        """Day-resolution datetime64 array from datetimes or date strings/ints, NaT if unparsable"""
+        return pd.to_datetime(pd.Series(dates).astype(str), errors='coerce').to_numpy().astype('datetime64[D]')
+
+    def load_fin_main_ratio(self):
+        """
+        fin_main_ratio restricted to the used report types and columns, sorted by entry date.
+        Loaded once per process; returns (data, entry dates, declare dates) with day-resolution date arrays
+        aligned to the rows of data, so a date window is a binary search on the entry dates.
+        """
         data_path = self.zyyx_path / 'fin_main_ratio.feather'
-        data = pd.read_feather(data_path)
+        if data_path not in _FIN_MAIN_RATIO_CACHE:
+            data = pd.read_feather(data_path, columns=self.FIN_MAIN_RATIO_KEYS + self.LAST4Q_COLUMNS)
+            data = data[data['REPORT_TYPE'].isin(self.REPORT_TYPES)]
+            entry_dates = data['ENTRYTIME'].to_numpy().astype('datetime64[D]')
+            order = np.argsort(entry_dates, kind='stable')
+            data = data.iloc[order].reset_index(drop=True)
+            _FIN_MAIN_RATIO_CACHE[data_path] = (data, entry_dates[order], self.to_day(data['DECLARE_DATE']))
+        return _FIN_MAIN_RATIO_CACHE[data_path]
+
+    # Regressions stacked into one batched solve
+    OLS_BATCH_SIZE = 64
+    # Absorb 'industry_dummy' regressors by within-industry demeaning instead of dummy columns
+    INDUSTRY_FIXED_EFFECTS = True
+
+    # As-of last-4-quarter std table built by build_last4q_asof, None until built
+    _last4q_asof = None
+    _trading_date = None
+
+    @property
+    def trading_date(self):
+        """TradingDate calendar, constructed once per instance"""
+        if self._trading_date is None:
+            self._trading_date = TradingDate()
+        return self._trading_date
+
+    def prepare_dates(self, dates):
+        """Backfill hook: precompute the as-of last-4-quarter table for a chunk of dates"""
+        self.build_last4q_asof(dates)
+
+    def build_last4q_asof(self, dates):
+        """
+        Precompute the last-4-quarter std of every stock for a range of trading dates.
+
+        Every report is visible on the dates where load_daily_data's point-in-time filters keep it
+        (entered and declared before the date, within the 2-year window, REPORT_YEAR >= year - 3).
+        Walking the appear/expire events of each stock in date order, the window (latest version of
+        each quarter, last 4 of at least 4 quarters) is only re-derived when one of its reports
+        changes, and only changes are recorded.
+
+        :param dates: trading dates the table is exact for
+        :return: as-of table (STOCK_CODE, valid_from, has_last4q, <column>_last4q_std ...), one row per
+                 change of a stock's window, valid until the stock's next row
+        """
+        td = self.trading_date
+        data, entry_dates, declare_dates = self.load_fin_main_ratio()
+        dates = sorted(dates)
+        calendar = self.to_day(dates)
+        window_starts = self.to_day([td.prev_tradingday(date, 2*252) for date in dates])
+
+        # Every report is visible on calendar positions [first, last)
+        year_end = (data['REPORT_YEAR'].to_numpy() + 4 - 1970).astype('datetime64[Y]').astype('datetime64[D]')
+        first = np.searchsorted(calendar, np.maximum(entry_dates, declare_dates), side='right')
+        last = np.minimum(np.searchsorted(window_starts, np.minimum(entry_dates, declare_dates), side='right'),
+                          np.searchsorted(calendar, year_end, side='left'))
+
+        # Priority of the versions of a quarter: the one load_daily_data keeps after its sort and dedup
+        priority = np.empty(len(data), dtype=np.int64)
+        priority[np.lexsort((np.arange(len(data)), data['UPDATETIME'].to_numpy(), data['REPORT_TYPE'].to_numpy(),
+                             data['REPORT_QUARTER'].to_numpy(), data['REPORT_YEAR'].to_numpy()))] = np.arange(len(data))
+        quarters = (data['REPORT_YEAR'].to_numpy() * 10 + data['REPORT_QUARTER'].to_numpy()).tolist()
+        stock_idx, stocks = pd.factorize(data['STOCK_CODE'], sort=True)
+
+        # Report stream: every visible report appears at first and expires at last (if within the dates)
+        visible = np.flatnonzero(first < last)
+        expiring = visible[last[visible] < len(calendar)]
+        ev_row = np.r_[visible, expiring]
+        ev_pos = np.r_[first[visible], last[expiring]]
+        ev_stock = stock_idx[ev_row]
+        ev_add = np.r_[np.ones(len(visible), dtype=bool), np.zeros(len(expiring), dtype=bool)]
+        order = np.lexsort((ev_pos, ev_stock))
+        stream = zip(ev_stock[order].tolist(), ev_pos[order].tolist(), ev_row[order].tolist(), ev_add[order].tolist())
+
+        changes = []
+        for stock, stock_events in groupby(stream, key=lambda event: event[0]):
+            active, current = {}, ()
+            for pos, date_events in groupby(stock_events, key=lambda event: event[1]):
+                for _, _, row, add in date_events:
+                    if add:
+                        active.setdefault(quarters[row], set()).add(row)
+                    else:
+                        active[quarters[row]].discard(row)
+                        if not active[quarters[row]]:
+                            del active[quarters[row]]
+                window = tuple(max(active[quarter], key=priority.__getitem__) for quarter in sorted(active))[-4:]
+                window = window if len(window) == 4 else ()
+                if window != current:
+                    changes.append((stock, pos, window or (-1,) * 4))
+                    current = window
+
+        change_stock = np.array([change[0] for change in changes], dtype=np.int64)
+        change_pos = np.array([change[1] for change in changes], dtype=np.int64)
+        rows = np.array([change[2] for change in changes], dtype=np.int64).reshape(-1, 4)
+        stats = self.window_std(data[self.LAST4Q_COLUMNS].to_numpy(dtype=float), rows)
 
-        data = data[(data['REPORT_TYPE'] == 1081) | (data['REPORT_TYPE'] == 1083)]
+        table = pd.DataFrame(stats, columns=[f'{col}_last4q_std' for col in self.LAST4Q_COLUMNS])
+        table.insert(0, 'STOCK_CODE', np.asarray(stocks)[change_stock])
+        table.insert(1, 'valid_from', calendar[change_pos])
+        table.insert(2, 'has_last4q', rows[:, 0] >= 0)
 
-        data["ENTRYDATE"] = data["ENTRYTIME"].dt.date
-        data = data[(data['ENTRYDATE'].astype(str) < date) & (data['ENTRYDATE'].astype(str) >= td.prev_tradingday(date, 2*252))]
+        self._last4q_asof = {
+            'table': table,
+            'calendar': calendar,
+            'stock_idx': change_stock,
+            'stocks': np.unique(change_stock),
+            # (stock, valid_from) as one sorted int64 key for the as-of binary search
+            'keys': (change_stock << 32) + calendar[change_pos].astype(np.int64),
+        }
+        return table
 
-        data = data[(data['DECLARE_DATE'].astype(str) < date) & (data['DECLARE_DATE'].astype(str) >= td.prev_tradingday(date, 2*252))]
+    @staticmethod
+    def window_std(values, rows, chunk_size=100000):
+        """
+        Sample std (ddof=1, NaN skipped, like pandas) of every column over each window of rows
+        :param values: (n_reports, n_columns) report values
+        :param rows: (n_windows, window) row ids, -1 for windows without data
+        """
+        out = np.full((len(rows), values.shape[1]), np.nan)
+        for start in range(0, len(rows), chunk_size):
+            ids = rows[start:start + chunk_size]
+            x = values[ids]
+            x[ids < 0] = np.nan
+            count = (~np.isnan(x)).sum(axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = np.nansum(x, axis=1) / count
+                var = np.nansum((x - mean[:, None]) ** 2, axis=1) / (count - 1)
+            var[count < 2] = np.nan
+            out[start:start + chunk_size] = np.sqrt(var)
+        return out
+
+    def last4q_std_asof(self, date):
+        """Cross-section of the as-of table on date, or None if date is not one of its trading dates"""
+        asof = self._last4q_asof
+        if asof is None:
+            return None
+        day = self.to_day([date])[0]
+        calendar = asof['calendar']
+        pos = np.searchsorted(calendar, day)
+        if pos == len(calendar) or calendar[pos] != day:
+            return None
+
+        # Last change on or before date of every stock
+        stocks = asof['stocks']
+        rows = np.searchsorted(asof['keys'], (stocks << 32) + day.astype(np.int64), side='right') - 1
+        found = rows >= 0
+        found[found] = asof['stock_idx'][rows[found]] == stocks[found]
+        rows = rows[found]
+        table = asof['table']
+        std_last4_df = table.iloc[rows]
+        std_last4_df = std_last4_df[std_last4_df['has_last4q']].drop(columns=['valid_from', 'has_last4q'])
+        std_last4_df = std_last4_df.reset_index(drop=True)
+        std_last4_df['date'] = date
+        return std_last4_df
+
+    def load_daily_data(self, date):
+        std_last4_df = self.last4q_std_asof(date)
+        if std_last4_df is not None:
+            return std_last4_df
+
+        td = self.trading_date
+        year = int(date[:4])
+        data, entry_dates, declare_dates = self.load_fin_main_ratio()
+
+        # Point-in-time window [start, date) on entry and declare dates
+        start, end = self.to_day([td.prev_tradingday(date, 2*252), date])
+        lo, hi = np.searchsorted(entry_dates, [start, end], side='left')
+        declared = declare_dates[lo:hi]
+        data = data.iloc[lo:hi][(declared < end) & (declared >= start)]
 
         data = data[data['REPORT_YEAR'] >= year - 3]
         data = data.sort_values(by=['REPORT_YEAR', 'REPORT_QUARTER', 'REPORT_TYPE', 'UPDATETIME'])
@@ -31,18 +214,9 @@ class fd_cs_regression(_PoolBaseDaily):
         reverse_rank = data.groupby('STOCK_CODE').cumcount(ascending=False)
 
         filtered_df = data[reverse_rank < 4]
-        columns_to_process = [
-            "GP_RATIO", "ROE", "ROA", "NF_MARGIN", "MAN_RATIO", "FE_RATIO", "MAR_RATIO", "TP_CE_RATIO", "EXP_RATIO",
-            "AR_TURNOVER", "INV_TURNOVER", "WC_TURNOVER", "TA_TURNOVER", "FA_TURNOVER", "CA_TURNOVER", "NA_TURNOVER",
-            "CA_RATIO", "MP_RATIO", "TMA_TATIO", "INV_RATIO", "FA_RATIO", "DS_RATIO", "DEBT_EQ_RATIO", "EQ_AS_RATIO",
-            "DEBT_AS_RATIO", "EQ_MULTIPLIER", "CUR_RATIO", "QUICK_RATIO", "CASH_RATIO", "INT_MULTIPLIER", "CD_RATIO",
-            "OR_GRATE_YOY", "OR_GRATE_OQ", "NP_GRATE_YOY", "NP_GRATE_OQ", "NA_GRATE_YOY", "NA_GRATE_OQ",
-            "FA_GRATE_YOY", "FA_GRATE_OQ", "OP_GRATE_YOY", "OP_GRATE_OQ", "NCFOA_CL_RATIO", "NCFOA_TL_RATIO",
-            "ICFOA_OR_RATIO", "ICFOA_OR_RATIO_TTM", "NCF_TA_RATIO", "NCF_TA_RATIO_TTM", "NCFOA_OR_RATIO",
-            "NCFOA_OR_RATIO_TTM", "NCFOA_NP_RATIO", "NCFOA_NP_RATIO_TTM"
-        ]
-        std_last4_df = filtered_df.groupby('STOCK_CODE')[columns_to_process].std().add_suffix('_last4q_std').reset_index()
+        std_last4_df = filtered_df.groupby('STOCK_CODE')[self.LAST4Q_COLUMNS].std().add_suffix('_last4q_std').reset_index()
         std_last4_df['date'] = date
+        return std_last4_df
 
 
     @property
@@ -88,45 +262,58 @@ class fd_cs_regression(_PoolBaseDaily):
         return REG_CONFIGS
 
     
-    def normalize_column(self, s, method, **kwargs):
-        """Generic normalization dispatcher"""
+    # Parameters of the methods in the REG_CONFIG normalize dicts
+    NORMALIZE_KWARGS = {'winsorize': {'lower': 0.05, 'upper': 0.95}}  # Defaults can be changed
+
+    def normalize_block(self, values, method, **kwargs):
+        """Normalize every column of a 1-D or 2-D array with one NaN-aware kernel call"""
         if method == 'mad_10':
-            return self.cut_mad_10(s)
+            return mad_clip(values, 10)
         elif method == 'winsorize':
-            return self.winsorize(s, **kwargs)
+            return winsorize_columns(values, **kwargs)
         elif method == 'gaussian_rank':
-            return self.gaussian_rank(s, **kwargs)
+            return gaussian_rank_columns(values, **{'clip_lower': 0.05, 'clip_upper': 0.95, **kwargs})
         else:
             raise ValueError(f"Unknown normalization method: {method}")
 
+    def normalize_column(self, s, method, **kwargs):
+        """Generic normalization dispatcher"""
+        return pd.Series(self.normalize_block(s.to_numpy(dtype=float), method, **kwargs), index=s.index, name=s.name)
+
+    def normalize_columns(self, data, normalize_config):
+        """Apply a config's normalize dict to data in place, one kernel call per method"""
+        columns_by_method = {}
+        for col, method in normalize_config.items():
+            if col in data.columns:  # Skip missing columns
+                columns_by_method.setdefault(method, []).append(col)
+        for method, cols in columns_by_method.items():
+            values = data[cols].to_numpy(dtype=float)
+            data[cols] = self.normalize_block(values, method, **self.NORMALIZE_KWARGS.get(method, {}))
+        return data
+
     def cut_mad_10(self, s):
-        median = s.median()
-        mad = s.mad()
-        return s.clip(median - 10 * mad, median + 10 * mad)
+        """Clip to median +- 10 median absolute deviations"""
+        return self.normalize_column(s, 'mad_10')
 
     def winsorize(self, s, lower=0.01, upper=0.99):
-        q = s.quantile([lower, upper])
-        return s.clip(q.iloc[0], q.iloc[1])
+        return self.normalize_column(s, 'winsorize', lower=lower, upper=upper)
 
     def gaussian_rank(self, s, clip_lower=0.05, clip_upper=0.95):
         """Gaussian rank normalization with optional clipping"""
-        ranked = s.rank(pct=True)
-        clipped = ranked.clip(clip_lower, clip_upper)
-        return clipped.apply(norm.ppf)
+        return self.normalize_column(s, 'gaussian_rank', clip_lower=clip_lower, clip_upper=clip_upper)
     
    
-    def calculate_cross_section_factors(self, date):
-        curr_df = self.load_daily_data(date)
-        
-        # Add transformed columns
-        curr_df['log_listing_age'] = np.log1p(curr_df['listing_age'])
-        curr_df['LOG_TA'] = np.log(curr_df['total_assets'])
-        
-       
-        curr_df, ind_cols = self.create_industry_dummies(curr_df)
-        
-        factor_results = curr_df[['stock_code']].copy()
-        
+    def regression_problems(self, curr_df, ind_cols=(), industry=None):
+        """
+        Prepare the REG_CONFIG regressions of one cross-section
+        :param ind_cols: industry dummy columns replacing 'industry_dummy' in a config's x
+        :param industry: integer industry group of every row (see industry_groups); if given,
+                         'industry_dummy' is absorbed by within-industry demeaning instead of dummies.
+                         Other x columns, such as 'sw1_dummy', are used as given in both cases
+        :return: list of (name, row positions in curr_df, y, X) for configs with enough data;
+                 X has a constant, or is industry-demeaned when the industry is absorbed
+        """
+        problems = []
         for config in self.reg_config:
             y_col = config['y']
             X_cols = config['x']
@@ -134,53 +321,145 @@ class fd_cs_regression(_PoolBaseDaily):
             
             
             X_cols_expanded = []
+            absorb_industry = False
             for col in X_cols:
-                if col == 'industry_dummy':
+                if col == 'industry_dummy' and industry is not None:
+                    absorb_industry = True
+                elif col == 'industry_dummy':
                     X_cols_expanded.extend(ind_cols)
                 else:
                     X_cols_expanded.append(col)
             
             # Prepare regression data
             all_cols = [y_col] + X_cols_expanded
-            data = curr_df[all_cols].dropna()
+            positions = np.flatnonzero(curr_df[all_cols].notna().all(axis=1).to_numpy())
+            data = curr_df[all_cols].iloc[positions]
             
             if len(data) < 10:
-                factor_results[config['name']] = np.nan
                 continue
                 
             # Apply column-wise normalization
-            for col, method in normalize_config.items():
-                if col not in data.columns:
-                    continue  # Skip missing columns
-                
-                # Handle method parameters
-                kwargs = {}
-                if method == 'winsorize':
-                    kwargs = {'lower': 0.05, 'upper': 0.95}  # Defaults can be changed
-                
-                data[col] = self.normalize_column(data[col], method, **kwargs)
+            data = self.normalize_columns(data, normalize_config)
             
             # Prepare matrices
-            y = data[y_col]
-            X = sm.add_constant(data[X_cols_expanded])
-            
-            # Run regression
+            y = data[y_col].to_numpy(dtype=float)
+            X = data[X_cols_expanded].to_numpy(dtype=float)
+            if absorb_industry:
+                # Frisch-Waugh: demeaning within industries gives the residuals of the dummy regression
+                groups = industry[positions]
+                y = self.demean_within(y[:, None], groups)[:, 0]
+                X = self.demean_within(X, groups)
+            else:
+                X = np.column_stack([np.ones(len(data)), X])
+            problems.append((config['name'], positions, y, X))
+        return problems
+
+    @staticmethod
+    def demean_within(values, groups):
+        """Subtract the group mean from every column of values (n_rows, n_columns)"""
+        counts = np.bincount(groups)
+        means = np.empty((len(counts), values.shape[1]))
+        for j in range(values.shape[1]):
+            with np.errstate(invalid='ignore'):
+                means[:, j] = np.bincount(groups, weights=values[:, j], minlength=len(counts)) / counts
+        return values - means[groups]
+
+    @staticmethod
+    def ols_residuals(designs, targets):
+        """
+        Residuals of stacked least-squares problems, solved like statsmodels OLS (pseudo-inverse)
+        :param designs: (n_problems, n_rows, n_regressors), rows and regressors beyond a problem's own all zero
+        :param targets: (n_problems, n_rows), zero beyond a problem's own rows
+        """
+        beta = np.linalg.pinv(designs) @ targets[..., None]
+        return targets - (designs @ beta)[..., 0]
+
+    def solve_regressions(self, problems):
+        """
+        Residuals of (name, positions, y, X) problems, zero-padded to a common shape and solved
+        OLS_BATCH_SIZE at a time; None for problems that failed
+        """
+        residuals = [None] * len(problems)
+        order = sorted(range(len(problems)), key=lambda i: problems[i][3].shape)
+        for start in range(0, len(order), self.OLS_BATCH_SIZE):
+            batch = order[start:start + self.OLS_BATCH_SIZE]
+            n_rows = max(len(problems[i][2]) for i in batch)
+            n_regressors = max(problems[i][3].shape[1] for i in batch)
+            designs = np.zeros((len(batch), n_rows, n_regressors))
+            targets = np.zeros((len(batch), n_rows))
+            for b, i in enumerate(batch):
+                _, _, y, X = problems[i]
+                designs[b, :len(y), :X.shape[1]] = X
+                targets[b, :len(y)] = y
+
             try:
-                model = sm.OLS(y, X).fit()
-                residuals = y - model.predict(X)
-                
-                # Map residuals to original index
-                factor_values = curr_df.index.map(
-                    pd.Series(residuals, index=data.index).to_dict()
-                ).fillna(np.nan)
-                factor_results[config['name']] = factor_values
-            except Exception as e:
-                print(f"Regression failed for {config['name']}: {str(e)}")
-                factor_results[config['name']] = np.nan
+                batch_residuals = self.ols_residuals(designs, targets)
+            except np.linalg.LinAlgError:
+                # Solve one by one so that only the failing regressions are lost
+                batch_residuals = [None] * len(batch)
+                for b, i in enumerate(batch):
+                    try:
+                        batch_residuals[b] = self.ols_residuals(designs[b:b + 1], targets[b:b + 1])[0]
+                    except np.linalg.LinAlgError as e:
+                        print(f"Regression failed for {problems[i][0]}: {str(e)}")
+            for b, i in enumerate(batch):
+                if batch_residuals[b] is not None:
+                    residuals[i] = batch_residuals[b][:len(problems[i][2])]
+        return residuals
+
+    def prepare_cross_section(self, date):
+        curr_df = self.load_daily_data(date)
+        
+        # Add transformed columns
+        curr_df['log_listing_age'] = np.log1p(curr_df['listing_age'])
+        curr_df['LOG_TA'] = np.log(curr_df['total_assets'])
         
-        return factor_results
+       
+        if self.INDUSTRY_FIXED_EFFECTS:
+            return curr_df, self.regression_problems(curr_df, industry=self.industry_groups(curr_df))
+        curr_df, ind_cols = self.create_industry_dummies(curr_df)
+        return curr_df, self.regression_problems(curr_df, ind_cols)
+
+    def calculate_cross_section_factors_batch(self, dates):
+        """
+        Cross-sectional residual factors of several dates, with the regressions of all configs
+        and dates solved together
+        :return: {date: factor_results}
+        """
+        frames, problems, owners = {}, [], []
+        for date in dates:
+            curr_df, date_problems = self.prepare_cross_section(date)
+            frames[date] = curr_df
+            problems.extend(date_problems)
+            owners.extend([date] * len(date_problems))
+
+        factors = {date: {config['name']: np.full(len(curr_df), np.nan) for config in self.reg_config}
+                   for date, curr_df in frames.items()}
+        for date, (name, positions, _, _), residuals in zip(owners, problems, self.solve_regressions(problems)):
+            if residuals is not None:
+                # Scatter residuals back to their rows by position
+                factors[date][name][positions] = residuals
+
+        results = {}
+        for date, curr_df in frames.items():
+            factor_results = curr_df[['stock_code']].copy()
+            for name, values in factors[date].items():
+                factor_results[name] = values
+            results[date] = factor_results
+        return results
+
+    def calculate_cross_section_factors(self, date):
+        return self.calculate_cross_section_factors_batch([date])[date]
 
     
+    def industry_groups(self, df, industry_col='industry_code'):
+        """
+        Integer industry group of every row for fixed-effects demeaning. Rows without an industry
+        join the first industry, the same intercept they share with it under drop_first dummies.
+        """
+        groups, _ = pd.factorize(df[industry_col], sort=True)
+        return np.maximum(groups, 0)
+
     def create_industry_dummies(self, df, industry_col='industry_code'):
         """Create industry dummy variables with prefix"""
         dummies = pd.get_dummies(
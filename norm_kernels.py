@@ -0,0 +1,128 @@
+import numpy as np
+from scipy.special import ndtri
+
+
+def as_block(x):
+    """View a 1-D or 2-D input as a float (n_rows, n_columns) block, plus its original shape"""
+    x = np.asarray(x, dtype=float)
+    return x.reshape(len(x), -1), x.shape
+
+
+def segment_bounds(n, starts=None):
+    """
+    Segment starts and lengths of n rows
+    :param starts: first row of every segment (e.g. every date of a date-sorted panel), None for one segment
+    """
+    starts = np.zeros(1, dtype=np.int64) if starts is None else np.asarray(starts, dtype=np.int64)
+    counts = np.diff(np.r_[starts, n])
+    return starts, counts
+
+
+def select_quantiles(block, qs):
+    """
+    Linearly interpolated quantiles of every column, ignoring NaN, from a single partition pass
+    :param block: (n_rows, n_columns) values
+    :param qs: quantile levels in [0, 1]
+    :return: (len(qs), n_columns) quantiles, NaN for columns without valid values
+    """
+    qs = np.asarray(qs, dtype=float)
+    out = np.full((len(qs), block.shape[1]), np.nan)
+    valid = len(block) - np.isnan(block).sum(axis=0)
+    # Columns with the same number of valid values share their order statistics positions
+    for n_valid in np.unique(valid):
+        if n_valid == 0:
+            continue
+        cols = np.flatnonzero(valid == n_valid)
+        pos = (n_valid - 1) * qs
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, n_valid - 1)
+        # np.partition places NaN after every valid value
+        part = np.partition(block[:, cols], np.unique(np.r_[lo, hi]), axis=0)
+        out[:, cols] = part[lo] + (pos - lo)[:, None] * (part[hi] - part[lo])
+    return out
+
+
+def quantile_bounds(x, lower=0.01, upper=0.99, starts=None):
+    """
+    Lower and upper quantiles of every column within every segment, ignoring NaN
+    :return: (q_low, q_high), each (n_segments, n_columns)
+    """
+    block, _ = as_block(x)
+    starts, counts = segment_bounds(len(block), starts)
+    bounds = np.empty((2, len(starts), block.shape[1]))
+    for i, (start, count) in enumerate(zip(starts, counts)):
+        bounds[:, i] = select_quantiles(block[start:start + count], (lower, upper))
+    return bounds[0], bounds[1]
+
+
+def winsorize(x, lower=0.01, upper=0.99, starts=None):
+    """
+    Clip every column to its [lower, upper] quantiles, computed per segment without NaN; NaN stays NaN
+    :param x: 1-D or (n_rows, n_columns) values
+    :param starts: segment starts of a row-sorted panel, None to treat all rows as one cross-section
+    """
+    block, shape = as_block(x)
+    starts, counts = segment_bounds(len(block), starts)
+    q_low, q_high = quantile_bounds(block, lower, upper, starts)
+    return np.clip(block, np.repeat(q_low, counts, axis=0), np.repeat(q_high, counts, axis=0)).reshape(shape)
+
+
+def mad_clip(x, n_mad=10, starts=None):
+    """
+    Clip every column to median +- n_mad * median absolute deviation, per segment, ignoring NaN;
+    both medians come from partition-based selection. NaN stays NaN.
+    """
+    block, shape = as_block(x)
+    starts, counts = segment_bounds(len(block), starts)
+    out = np.empty_like(block)
+    for start, count in zip(starts, counts):
+        segment = block[start:start + count]
+        median = select_quantiles(segment, (0.5,))[0]
+        mad = select_quantiles(np.abs(segment - median), (0.5,))[0]
+        out[start:start + count] = np.clip(segment, median - n_mad * mad, median + n_mad * mad)
+    return out.reshape(shape)
+
+
+def _average_rank(block):
+    """1-based ranks of every column of one segment, ties averaged, NaN for NaN"""
+    n = len(block)
+    order = np.argsort(block, axis=0, kind='stable')
+    sorted_x = np.take_along_axis(block, order, axis=0)
+
+    # First and last position of every run of equal values
+    idx = np.arange(n)[:, None]
+    first = np.ones(block.shape, dtype=bool)
+    first[1:] = sorted_x[1:] != sorted_x[:-1]
+    last = np.ones(block.shape, dtype=bool)
+    last[:-1] = first[1:]
+    first_pos = np.maximum.accumulate(np.where(first, idx, 0), axis=0)
+    last_pos = np.minimum.accumulate(np.where(last, idx, n)[::-1], axis=0)[::-1]
+
+    ranks = np.empty(block.shape)
+    np.put_along_axis(ranks, order, (first_pos + last_pos) / 2 + 1, axis=0)
+    ranks[np.isnan(block)] = np.nan
+    return ranks
+
+
+def pct_rank(x, starts=None):
+    """Average rank divided by the number of valid values of the column, per segment (Series.rank(pct=True))"""
+    block, shape = as_block(x)
+    starts, counts = segment_bounds(len(block), starts)
+    out = np.empty_like(block)
+    for start, count in zip(starts, counts):
+        segment = block[start:start + count]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out[start:start + count] = _average_rank(segment) / (~np.isnan(segment)).sum(axis=0)
+    return out.reshape(shape)
+
+
+def gaussian_rank(x, clip_lower=None, clip_upper=None, starts=None):
+    """
+    Inverse normal CDF of the percentile rank of every column, per segment, ignoring NaN
+    :param clip_lower: lower clip of the percentile ranks before the transform, None for no clip
+    :param clip_upper: upper clip of the percentile ranks, None for no clip (rank 1 maps to inf)
+    """
+    ranked = pct_rank(x, starts)
+    if clip_lower is not None or clip_upper is not None:
+        ranked = np.clip(ranked, clip_lower, clip_upper)
+    return ndtri(ranked)
@@ -1,31 +1,72 @@
 import pandas as pd
 import numpy as np
-from scipy.stats import zscore, rankdata
-from scipy.special import ndtri
-
-# 新增标准化方法
-def guassian_rank(x):
-    ranked = rankdata(x) / len(x)
-    return ndtri(ranked)
-
-def cut_mad_10(x):
-    median = np.median(x)
-    mad = np.median(np.abs(x - median))
-    lower = median - 10 * mad
-    upper = median + 10 * mad
-    return np.clip(x, lower, upper)
-
-def winsorie(x, lower=0.01, upper=0.99):
-    q_low = np.quantile(x, lower)
-    q_high = np.quantile(x, upper)
-    return np.clip(x, q_low, q_high)
-
-def safe_zscore(x):
-    x = x.fillna(0)
-    std = x.std()
-    if std == 0:
-        return np.zeros_like(x)
-    return (x - x.mean()) / std
+from factor_expr import compile_factors
+from norm_kernels import as_block, segment_bounds, quantile_bounds, winsorize, mad_clip, gaussian_rank
+
+# ================== 分段工具 ==================
+# 面板数据按日期排序后，每个日期是一段连续的行；starts 为各段起始行号，None 表示整体为一段
+def date_segments(df, date_col=None):
+    """
+    按日期分段
+    :return: (按日期稳定排序的行号, 各段起始位置)；date_col 为 None 时为 (None, None)
+    """
+    if date_col is None:
+        return None, None
+    dates = df[date_col].to_numpy()
+    order = np.argsort(dates, kind='stable')
+    dates = dates[order]
+    starts = np.flatnonzero(np.r_[True, dates[1:] != dates[:-1]]) if len(dates) else np.zeros(1, dtype=np.int64)
+    return order, starts
+
+# 新增标准化方法（支持二维数组按列处理，starts 给出时按段独立标准化；缺失值按0处理）
+def guassian_rank(x, starts=None):
+    return gaussian_rank(np.nan_to_num(as_block(x)[0], nan=0.0), starts=starts).reshape(np.shape(x))
+
+def cut_mad_10(x, starts=None):
+    return mad_clip(np.nan_to_num(as_block(x)[0], nan=0.0), 10, starts=starts).reshape(np.shape(x))
+
+def winsorie(x, lower=0.01, upper=0.99, starts=None):
+    # 分位数只用有效值计算，缺失值置0后再截断
+    block, shape = as_block(x)
+    starts, counts = segment_bounds(len(block), starts)
+    q_low, q_high = quantile_bounds(block, lower, upper, starts)
+    block = np.nan_to_num(block, nan=0.0)
+    return np.clip(block, np.repeat(q_low, counts, axis=0), np.repeat(q_high, counts, axis=0)).reshape(shape)
+
+def safe_zscore(x, starts=None):
+    block, shape = as_block(x)
+    block = np.nan_to_num(block, nan=0.0)
+    starts, counts = segment_bounds(len(block), starts)
+    mean = np.add.reduceat(block, starts, axis=0) / counts[:, None]
+    centered = block - np.repeat(mean, counts, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        std = np.sqrt(np.add.reduceat(centered ** 2, starts, axis=0) / (counts[:, None] - 1))
+    std = np.repeat(std, counts, axis=0)
+    return np.divide(centered, std, out=np.zeros_like(block), where=std != 0).reshape(shape)
+
+NORMALIZERS = {
+    'guassian_rank': guassian_rank,
+    'cut_mad_10': cut_mad_10,
+    'winsorie': winsorie,
+    'safe_zscore': safe_zscore,
+}
+
+# 配置中使用的方法别名
+NORMALIZE_ALIASES = {
+    'mad_10': 'cut_mad_10',
+}
+
+def config_norm_method(config):
+    """配置的标准化方法（别名换成 NORMALIZERS 中的名称）；未配置 normalize_method 时为 None，表示直接使用原始字段"""
+    method = config.get('normalize_method')
+    method = NORMALIZE_ALIASES.get(method, method)
+    if method is not None and method not in NORMALIZERS:
+        raise ValueError(f"未知的标准化方法: {method}")
+    return method
+
+def norm_column(field, method):
+    """标准化结果列名，同一字段不同方法互不覆盖"""
+    return f"{field}_{method}"
 
 # ================== 因子配置 ==================
 FACTOR_CONFIGS = [
@@ -102,55 +143,123 @@ FACTOR_CONFIGS = [
 ]
 
 # ================== 核心函数 ==================
-def calculate_factors(df, configs=FACTOR_CONFIGS):
+def normalize_fields(df, configs=FACTOR_CONFIGS, date_col=None):
+    """
+    按 (字段, 方法) 去重后批量标准化
+    :param df: 包含原始字段的DataFrame
+    :param date_col: 日期列名，给出时按日期截面分别标准化
+    :return: 标准化结果DataFrame，列名为 norm_column(field, method)
+    """
+    # 每种方法需要处理的字段（去重，保持出现顺序）
+    fields_by_method = {}
+    for config in configs:
+        method = config_norm_method(config)
+        if method is None:
+            continue
+        fields = fields_by_method.setdefault(method, [])
+        for field in config['base_fields']:
+            if field in df.columns and field not in fields:
+                fields.append(field)
+
+    order, starts = date_segments(df, date_col)
+    blocks = []
+    for method, fields in fields_by_method.items():
+        if not fields:
+            continue
+        block = df[fields].to_numpy(dtype=float, na_value=np.nan)
+        if order is not None:
+            block = block[order]
+        normed = NORMALIZERS[method](block, starts=starts)
+        if order is not None:
+            block[order] = normed
+            normed = block
+        blocks.append(pd.DataFrame(normed, index=df.index,
+                                   columns=[norm_column(field, method) for field in fields]))
+    return pd.concat(blocks, axis=1) if blocks else pd.DataFrame(index=df.index)
+
+def resolve_norm_name(config, name):
+    """表达式中的 <field>_norm / <FIELD>_NORM 指向本配置标准化方法的结果列，未配置标准化方法时指向原始字段"""
+    method = config_norm_method(config)
+    for field in config['base_fields']:
+        # 字段名大小写不限（如 base_fields 为 ta_ca，表达式中写 TA_CA_NORM）
+        if name.lower() == f"{field}_norm".lower():
+            return field if method is None else norm_column(field, method)
+    return name
+
+# 已编译的计算图，按配置内容缓存
+_GRAPH_CACHE = {}
+
+def get_factor_graph(configs):
+    """编译（或取缓存的）全部因子表达式的共享计算图"""
+    key = tuple((config['name'], config['expression'], config.get('normalize_method'), tuple(config['base_fields']))
+                for config in configs)
+    if key not in _GRAPH_CACHE:
+        _GRAPH_CACHE[key] = compile_factors(configs, resolve=resolve_norm_name)
+    return _GRAPH_CACHE[key]
+
+def calculate_factors(df, configs=FACTOR_CONFIGS, date_col=None, stock_col=None):
     """
     因子计算与标准化主函数
     :param df: 包含原始字段的DataFrame
+    :param date_col: 日期列名；给出时为面板模式，标准化与缩尾均按日期截面分别计算
+    :param stock_col: 股票代码列名；给出时 LAG/SUM 等时序函数按股票、日期顺序计算
     :return: 包含所有因子及标准化结果的DataFrame
     """
-    result_df = df.copy()
+    # 对基础数据进行标准化，每个 (字段, 方法) 只计算一次
+    norm_df = normalize_fields(df, configs, date_col=date_col)
+    result_df = pd.concat([df, norm_df], axis=1)
+    order, starts = date_segments(df, date_col)
 
-    # 对基础数据进行标准化
-    for config in configs:
-        for field in config['base_fields']:
-            if field in result_df.columns:
-                norm_col = f"{field}_norm"
-                method = config['normalize_method']
-                if method == 'guassian_rank':
-                    result_df[norm_col] = guassian_rank(result_df[field].fillna(0))
-                elif method == 'cut_mad_10':
-                    result_df[norm_col] = cut_mad_10(result_df[field].fillna(0))
-                elif method == 'winsorie':
-                    result_df[norm_col] = winsorie(result_df[field].fillna(0))
-                elif method == 'safe_zscore':
-                    result_df[norm_col] = safe_zscore(result_df[field])
+    # 计算顺序：有 stock_col 时按 (股票, 日期) 排列，时序函数沿每只股票的历史计算
+    if stock_col is not None:
+        stocks = df[stock_col].to_numpy()
+        sort_keys = (stocks,) if date_col is None else (df[date_col].to_numpy(), stocks)
+        rows = np.lexsort(sort_keys)
+    else:
+        stocks, rows = None, None
 
+    # 按行业范围分组：不限行业的因子一次计算，行业特异因子只在对应行上计算并按位置写回
+    graph = get_factor_graph(configs)
+    outputs_by_industry = {}
     for config in configs:
-        # 行业特异性检查
-        if 'industry_specific' in config:
-            industry_mask = df['industry_code'].isin(config['industry_specific'])
-            temp_df = df.loc[industry_mask].copy()
+        if config['name'] in graph.outputs:
+            industries = tuple(config['industry_specific']) if 'industry_specific' in config else None
+            outputs_by_industry.setdefault(industries, []).append(config['name'])
+
+    factor_values = {}
+    for industries, names in outputs_by_industry.items():
+        if industries is None:
+            sub_rows = rows
         else:
-            temp_df = df.copy()
+            industry_mask = df['industry_code'].isin(industries).to_numpy()
+            sub_rows = np.flatnonzero(industry_mask) if rows is None else rows[industry_mask[rows]]
+        group = None if stocks is None else stocks[sub_rows]
+        factor_values.update(graph.evaluate(result_df, group=group, rows=sub_rows, outputs=names))
 
-        try:
-            # 计算原始因子
-            result_df[config['name']] = temp_df.eval(config['expression'])
+    factors = {}
+    for config in configs:
+        name = config['name']
+        if name not in factor_values:
+            error = graph.errors.get(name, f"缺少字段 {config['base_fields']}")
+            print(f"计算因子 {name} 失败: {error}")
+            factors[name] = np.full(len(df), np.nan)
+            continue
 
-            # 处理分母为零的情况
-            result_df[config['name']] = result_df[config['name']].replace([np.inf, -np.inf], np.nan)
+        # 处理分母为零的情况
+        values = np.where(np.isinf(factor_values[name]), np.nan, factor_values[name])
 
-            # 缩尾处理
-            if 'winsorize' in config:
-                lower, upper = config['winsorize']
-                q_low = result_df[config['name']].quantile(lower)
-                q_high = result_df[config['name']].quantile(upper)
-                result_df[config['name']] = result_df[config['name']].clip(q_low, q_high)
+        # 缩尾处理（忽略NaN，面板模式下按日期截面）
+        if 'winsorize' in config:
+            lower, upper = config['winsorize']
+            if order is None:
+                values = winsorize(values, lower, upper)
+            else:
+                values[order] = winsorize(values[order], lower, upper, starts=starts)
 
-        except Exception as e:
-            print(f"计算因子 {config['name']} 失败: {str(e)}")
-            result_df[config['name']] = np.nan
+        factors[name] = values
 
+    factor_df = pd.DataFrame(factors, index=df.index)
+    result_df = pd.concat([result_df.drop(columns=factor_df.columns, errors='ignore'), factor_df], axis=1)
     return result_df
 
 # ================== 使用示例 ==================